@@ -7,16 +7,23 @@ import base64
 import os
 import sys
 import logging
-import pickle
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import modules from different folders
 from data_collection.scraper import scrape_cppp_tenders, scrape_gem_tenders, get_all_tenders
-from data_processing.processor import extract_text_from_pdf, extract_key_details
-from recommendation.matcher import train_vectorizer, get_tender_vectors, match_profile_to_tenders
+from data_processing.processor import extract_text_from_pdf, extract_key_details, process_tender_document
+from recommendation.embeddings import get_embedding_model, load_embedding_index, semantic_top_k_matches
+from recommendation.matcher import load_vectorizer as load_saved_vectorizer, train_vectorizer, update_vectorizer, load_tender_vectors, get_tender_vectors, match_profile_to_tenders, top_k_matches
 from notification.notifier import send_email_notification
+from notification.dispatcher import NotificationDispatcher, get_deliveries
+from notification.ledger import send_new_matches, subscribe
+from data_processing.dedup import deduplicate_store
+from scheduler.worker import is_stale, load_snapshot, refresh_artifacts
+from storage.export import EXPORT_FORMATS, export_tenders
+from monitoring import metrics
+from storage import tender_store
 
 # Configure logging
 logging.basicConfig(
@@ -32,9 +39,27 @@ logger = logging.getLogger(__name__)
 # Constants
 DATA_DIR = "data"
 PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
-TENDERS_FILE = os.path.join(DATA_DIR, "tenders.pkl")
+TENDERS_FILE = os.path.join(DATA_DIR, "tenders.pkl")  # legacy store, imported once
 VECTORIZER_FILE = os.path.join(DATA_DIR, "vectorizer.pkl")
 
+# Update the TF-IDF model incrementally on refresh instead of refitting it
+INCREMENTAL_VECTORIZER = True
+
+# Matching backends offered in the sidebar; the first is the default
+MATCH_BACKENDS = ["TF-IDF", "Semantic (embeddings)"]
+
+# Columns shown in the tender grids
+DISPLAY_COLUMNS = ["tender_id", "title", "organization", "deadline", "emd_amount", "source"]
+
+# Distinct search/filter combinations kept per store version in the shared cache
+BROWSE_CACHE_ENTRIES = 64
+
+# Tenders per page of the All Tenders grid; the store returns one page at a time
+PAGE_SIZE = 50
+
+# Columns of the All Tenders grid and its export
+BROWSE_COLUMNS = DISPLAY_COLUMNS + ["description", "url"]
+
 # Create necessary directories
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(PROFILE_DIR, exist_ok=True)
@@ -43,21 +68,134 @@ os.makedirs(PROFILE_DIR, exist_ok=True)
 # Streamlit UI Functions
 # --------------------------------
 
-def load_data():
-    """Load tenders data or create if not exists"""
-    if os.path.exists(TENDERS_FILE):
-        return pd.read_pickle(TENDERS_FILE)
-    else:
-        return get_all_tenders()
+@st.cache_resource(show_spinner=False)
+def init_store():
+    """Fill an empty tender store from the legacy pickle or a first scrape, once per process"""
+    if tender_store.count_tenders() == 0:
+        if os.path.exists(TENDERS_FILE):
+            tender_store.import_pickle(TENDERS_FILE)
+            # The legacy file may hold tenders that closed since it was written
+            tender_store.archive_expired()
+            deduplicate_store()
+        else:
+            get_all_tenders()
+
+def load_running_snapshot():
+    """
+    The latest snapshot while the scheduler (scheduler/worker.py) is running.
+    None when it never ran or has stopped; the app then refreshes the
+    tenders and matching artifacts itself.
+    """
+    snapshot = load_snapshot()
+    if snapshot is None or is_stale(snapshot):
+        return None
+    return snapshot
+
+def get_data_version():
+    """
+    Store version served to users: the one pinned by the scheduler's latest
+    snapshot while it runs, else the live store version
+    """
+    snapshot = load_running_snapshot()
+    if snapshot is not None and snapshot.get("store_version") is not None:
+        return snapshot["store_version"]
+    return tender_store.get_store_version()
+
+# Shared across sessions and reruns. Cached values are keyed on the store
+# version, so a refresh (from any session or process) bumps the version and
+# the next rerun loads fresh copies; max_entries drops the stale ones.
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def load_data(store_version):
+    """Open canonical tenders for a store version, one copy shared by all sessions (treat as read-only)"""
+    return tender_store.query_tenders(canonical_only=True, active_only=True)
 
 def load_vectorizer():
     """Load TF-IDF vectorizer or create if not exists"""
-    if os.path.exists(VECTORIZER_FILE):
-        with open(VECTORIZER_FILE, "rb") as f:
-            return pickle.load(f)
+    vectorizer = load_saved_vectorizer()
+    if vectorizer is not None:
+        return vectorizer
     else:
-        tenders_df = load_data()
-        return train_vectorizer(tenders_df)
+        tenders_df = tender_store.query_tenders(columns=["tender_id", "title", "description", "content_hash"])
+        return train_vectorizer(tenders_df, incremental=INCREMENTAL_VECTORIZER)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_vectorizer(store_version):
+    """
+    Vectorizer whose persisted tender matrix matches a store version, shared by
+    all sessions. A fresh copy is loaded and updated, so sessions still using
+    the previous one are not affected. While the scheduler runs it owns the
+    artifacts, and the saved vectorizer is used as is.
+    """
+    vectorizer = load_vectorizer()
+    if load_running_snapshot() is None and load_tender_vectors(vectorizer, store_version) is None:
+        vectorizer = update_vectorizer(vectorizer, store_version, incremental=INCREMENTAL_VECTORIZER)
+    return vectorizer
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def load_sources(store_version):
+    """Distinct tender sources for the source filter"""
+    return tender_store.get_sources()
+
+@st.cache_data(max_entries=BROWSE_CACHE_ENTRIES, show_spinner=False)
+def browse_tenders(store_version, search_term, sources, page=1):
+    """One page of the All Tenders grid; search, source filter and paging run in the store"""
+    sources = list(sources) if sources else None
+    offset = (page - 1) * PAGE_SIZE
+    if search_term:
+        return tender_store.search_tenders(search_term, columns=BROWSE_COLUMNS, sources=sources, canonical_only=True,
+                                           active_only=True, limit=PAGE_SIZE, offset=offset)
+    return tender_store.query_tenders(columns=BROWSE_COLUMNS, sources=sources, canonical_only=True, active_only=True,
+                                      limit=PAGE_SIZE, offset=offset)
+
+@st.cache_data(max_entries=BROWSE_CACHE_ENTRIES, show_spinner=False)
+def count_browse(store_version, search_term, sources):
+    """Number of tenders behind the All Tenders grid"""
+    sources = list(sources) if sources else None
+    return tender_store.count_tenders(sources=sources, canonical_only=True, active_only=True,
+                                      search_text=search_term or None)
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def load_dashboard_data(store_version):
+    """
+    Aggregates for the dashboard: counts by source, upcoming deadline month,
+    EMD bucket and top organizations, read from the rollups kept at ingest
+    """
+    source_counts = tender_store.get_rollup("source")
+    
+    # Months already past only hold tenders closing before the next archival run
+    deadline_counts = tender_store.get_rollup("deadline_month")
+    deadline_counts = deadline_counts[deadline_counts.index >= pd.Timestamp.now().strftime("%Y-%m")]
+    
+    emd_counts = tender_store.get_rollup("emd_bucket")
+    org_counts = tender_store.get_rollup("organization", limit=10)
+    return source_counts, deadline_counts, emd_counts, org_counts
+
+def metrics_tables(snap):
+    """Stage latencies and counters of a metrics snapshot as dataframes for the diagnostics tab"""
+    stages = pd.DataFrame([
+        {
+            "stage": histogram["labels"].get("stage"),
+            "count": histogram["count"],
+            "mean_s": histogram["mean"],
+            "p50_s": histogram["p50"],
+            "p95_s": histogram["p95"],
+            "max_s": histogram["max"],
+            "total_s": histogram["sum"]
+        }
+        for histogram in snap["histograms"] if histogram["name"] == "stage_seconds"
+    ])
+    if not stages.empty:
+        stages = stages.sort_values("total_s", ascending=False)
+    counters = pd.DataFrame([
+        {
+            "metric": counter["name"],
+            "labels": ", ".join(f"{key}={value}" for key, value in counter["labels"].items()),
+            "value": counter["value"]
+        }
+        for counter in snap["counters"]
+    ])
+    return stages, counters
 
 def save_uploaded_file(uploaded_file):
     """Save an uploaded file to disk"""
@@ -73,6 +211,24 @@ def get_file_download_link(df, filename, text):
     href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">{text}</a>'
     return href
 
+@st.cache_resource(show_spinner=False)
+def get_embedder():
+    """Embedding model for semantic matching, loaded once per process"""
+    return get_embedding_model()
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_embedding_index(store_version):
+    """
+    Semantic index built for a store version, or None until it is built.
+    The scheduler (or the Refresh button) builds it; requests only load it.
+    """
+    return load_embedding_index(get_embedder(), store_version)
+
+@st.cache_resource(show_spinner=False)
+def get_dispatcher():
+    """Notification dispatcher shared by all sessions, sending from background threads"""
+    return NotificationDispatcher()
+
 # --------------------------------
 # Main Streamlit App
 # --------------------------------
@@ -89,13 +245,11 @@ def main():
     * Get instant recommendations based on your capabilities
     """)
     
-    # Initialize session state variables if not exists
-    if "tenders_df" not in st.session_state:
-        st.session_state.tenders_df = load_data()
-    
-    if "vectorizer" not in st.session_state:
-        st.session_state.vectorizer = load_vectorizer()
+    # Tenders, vectorizer and aggregates live in the shared cache, keyed on the store version
+    init_store()
+    store_version = get_data_version()
     
+    # Initialize session state variables if not exists
     if "profile_text" not in st.session_state:
         st.session_state.profile_text = ""
     
@@ -108,16 +262,35 @@ def main():
     if "match_threshold" not in st.session_state:
         st.session_state.match_threshold = 0.3
     
+    if "match_backend" not in st.session_state:
+        st.session_state.match_backend = MATCH_BACKENDS[0]
+    
     # Create sidebar
     with st.sidebar:
         st.header("Options")
         
-        # Refresh data button
-        if st.button("Refresh Tender Data"):
+        snapshot = load_snapshot()
+        scheduler_running = snapshot is not None and not is_stale(snapshot)
+        if scheduler_running:
+            # The scheduler scrapes in the background; reruns pick up its latest snapshot
+            st.caption(f"Tenders last updated {snapshot.get('published_at')} (UTC) by the scheduler")
+        elif snapshot is not None:
+            last_run = snapshot.get("checked_at") or snapshot.get("published_at")
+            st.caption(f"The scheduler has not run since {last_run} (UTC)")
+        
+        # Refresh data button, scraping inline when no scheduler is running (or it has stopped)
+        if not scheduler_running and st.button("Refresh Tender Data"):
             with st.spinner("Fetching latest tenders..."):
-                st.session_state.tenders_df = get_all_tenders()
-                st.session_state.vectorizer = train_vectorizer(st.session_state.tenders_df)
-            st.success(f"Loaded {len(st.session_state.tenders_df)} tenders!")
+                stats = get_all_tenders(incremental=True)
+                # A changed store gets a new version, so the cached data is reloaded below
+                store_version = tender_store.get_store_version()
+                refresh_artifacts(store_version)
+                get_embedding_index.clear()
+            st.success(
+                f"Loaded {stats['open']} tenders! "
+                f"({stats.get('new', 0)} new, {stats.get('updated', 0)} updated, {stats.get('unchanged', 0)} unchanged, "
+                f"{stats.get('duplicates', 0)} duplicates merged, {stats.get('archived', 0)} closed tenders archived)"
+            )
         
         st.divider()
         
@@ -137,7 +310,8 @@ def main():
                 with st.spinner("Processing uploaded profile..."):
                     file_path = save_uploaded_file(uploaded_file)
                     if uploaded_file.type == "application/pdf":
-                        st.session_state.profile_text = extract_text_from_pdf(file_path)
+                        # Cached by file content, so re-uploading the same profile skips parsing
+                        st.session_state.profile_text = process_tender_document(file_path)["full_text"]
                     elif uploaded_file.type == "text/plain":
                         st.session_state.profile_text = uploaded_file.getvalue().decode("utf-8")
                     else:
@@ -158,6 +332,12 @@ def main():
             value=st.session_state.match_threshold,
             step=0.05
         )
+        st.session_state.match_backend = st.selectbox(
+            "Matching backend:",
+            MATCH_BACKENDS,
+            index=MATCH_BACKENDS.index(st.session_state.match_backend),
+            help="Semantic matching ranks tenders by embedding similarity with an approximate nearest-neighbour index"
+        )
         
         # Notification options
         st.subheader("Notifications")
@@ -167,7 +347,7 @@ def main():
         )
     
     # Main content area - tabs
-    tab1, tab2, tab3 = st.tabs(["All Tenders", "Recommended Tenders", "Dashboard"])
+    tab1, tab2, tab3, tab4 = st.tabs(["All Tenders", "Recommended Tenders", "Dashboard", "Diagnostics"])
     
     # Tab 1: All Tenders
     with tab1:
@@ -178,37 +358,61 @@ def main():
         with col1:
             search_term = st.text_input("Search tenders:", "")
         with col2:
+            sources = load_sources(store_version)
             source_filter = st.multiselect(
                 "Filter by source:",
-                options=st.session_state.tenders_df["source"].unique(),
-                default=st.session_state.tenders_df["source"].unique()
-            )
-        
-        # Apply filters
-        filtered_df = st.session_state.tenders_df
-        if search_term:
-            mask = (
-                filtered_df["title"].str.contains(search_term, case=False, na=False) | 
-                filtered_df["description"].str.contains(search_term, case=False, na=False) |
-                filtered_df["organization"].str.contains(search_term, case=False, na=False)
+                options=sources,
+                default=sources
             )
-            filtered_df = filtered_df[mask]
         
-        if source_filter:
-            filtered_df = filtered_df[filtered_df["source"].isin(source_filter)]
+        # Apply filters; only the requested page is read from the store
+        total = count_browse(store_version, search_term, tuple(source_filter))
+        pages = max(1, -(-total // PAGE_SIZE))
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+        filtered_df = browse_tenders(store_version, search_term, tuple(source_filter), int(page))
         
         # Display tenders
         st.dataframe(
-            filtered_df[["tender_id", "title", "organization", "deadline", "emd_amount", "source"]],
+            filtered_df[DISPLAY_COLUMNS],
             use_container_width=True,
             hide_index=True
         )
+        if total:
+            first = (int(page) - 1) * PAGE_SIZE + 1
+            st.caption(f"Showing {first}-{first + len(filtered_df) - 1} of {total} tenders")
         
-        # Download option
-        st.markdown(
-            get_file_download_link(filtered_df, "tenders.csv", "Download tenders as CSV"),
-            unsafe_allow_html=True
-        )
+        # Download option; the export streams every matching tender to a file
+        col1, col2 = st.columns(2)
+        with col1:
+            export_format = st.selectbox("Export format:", EXPORT_FORMATS)
+        
+        # A prepared export belongs to the filters it was made with; it is dropped once they change
+        export_filters = (export_format, search_term, tuple(source_filter))
+        export = st.session_state.get("export")
+        if export is not None and export["filters"] != export_filters:
+            if os.path.exists(export["path"]):
+                os.remove(export["path"])
+            export = st.session_state.export = None
+        
+        with col2:
+            if st.button("Prepare export"):
+                try:
+                    path, rows = export_tenders(
+                        export_format, columns=BROWSE_COLUMNS, search_text=search_term or None,
+                        sources=list(source_filter) or None, canonical_only=True, active_only=True
+                    )
+                    export = st.session_state.export = {"filters": export_filters, "path": path}
+                except ImportError as e:
+                    st.error(str(e))
+        
+        if export is not None and os.path.exists(export["path"]):
+            # Streamlit reads the open file itself, without another copy held here
+            with open(export["path"], "rb") as f:
+                st.download_button(
+                    f"Download tenders as {export_format.upper()}",
+                    f,
+                    file_name=f"tenders.{export_format}"
+                )
     
     # Tab 2: Recommended Tenders
     with tab2:
@@ -219,12 +423,30 @@ def main():
         else:
             # Match button
             if st.button("Match Tenders to Profile"):
-                with st.spinner("Analyzing and matching tenders..."):
-                    st.session_state.match_results = match_profile_to_tenders(
-                        st.session_state.profile_text,
-                        st.session_state.tenders_df,
-                        st.session_state.vectorizer
-                    )
+                tenders_df = load_data(store_version)
+                if tenders_df.empty:
+                    st.session_state.match_results = None
+                    st.info("There are no open tenders to match right now. Refresh the tender data and try again.")
+                else:
+                    with st.spinner("Analyzing and matching tenders..."):
+                        if st.session_state.match_backend == MATCH_BACKENDS[0]:
+                            st.session_state.match_results = top_k_matches(
+                                st.session_state.profile_text,
+                                tenders_df,
+                                get_vectorizer(store_version),
+                                store_version=store_version
+                            )
+                        elif get_embedding_index(store_version) is None:
+                            st.session_state.match_results = None
+                            st.info("The semantic index has not been built for the latest tenders yet. The scheduler "
+                                    "builds it after each update, as does Refresh Tender Data; use TF-IDF meanwhile.")
+                        else:
+                            st.session_state.match_results = semantic_top_k_matches(
+                                st.session_state.profile_text,
+                                tenders_df,
+                                get_embedding_index(store_version),
+                                get_embedder()
+                            )
             
             # Display match results
             if st.session_state.match_results is not None:
@@ -251,13 +473,33 @@ def main():
                     
                     # Send notifications option
                     if st.session_state.notification_email and st.button("Send Email Notifications"):
-                        with st.spinner("Sending notifications..."):
-                            sent_count = 0
-                            for _, tender in matches_df.iterrows():
-                                if send_email_notification(st.session_state.notification_email, tender):
-                                    sent_count += 1
-                            
-                            st.success(f"Sent {sent_count} notification emails!")
+                        # One digest for the matches not notified before, sent in the background
+                        queued = send_new_matches(
+                            get_dispatcher(), st.session_state.notification_email,
+                            st.session_state.profile_text, matches_df
+                        )
+                        if queued:
+                            st.success(f"Queued a digest of {queued} new tenders for {st.session_state.notification_email}!")
+                        else:
+                            st.info("All of these tenders were already notified.")
+                    
+                    if st.session_state.notification_email and st.button("Subscribe to Nightly Alerts"):
+                        subscribe(
+                            st.session_state.notification_email,
+                            st.session_state.profile_text,
+                            st.session_state.match_threshold
+                        )
+                        st.success("Subscribed! New matching tenders will be emailed nightly.")
+                    
+                    if st.session_state.notification_email:
+                        deliveries = get_deliveries(st.session_state.notification_email, limit=5)
+                        if not deliveries.empty:
+                            st.caption("Recent notifications")
+                            st.dataframe(
+                                deliveries[["created_at", "status", "attempts", "error"]],
+                                use_container_width=True,
+                                hide_index=True
+                            )
                 else:
                     st.info("No matching tenders found above the threshold score. Try lowering the threshold.")
     
@@ -265,32 +507,66 @@ def main():
     with tab3:
         st.header("Tender Analytics Dashboard")
         
+        source_counts, deadline_counts, emd_counts, org_counts = load_dashboard_data(store_version)
+        
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("Tenders by Source")
-            source_counts = st.session_state.tenders_df["source"].value_counts()
             st.bar_chart(source_counts)
         
         with col2:
             st.subheader("Upcoming Deadlines")
-            # Convert deadline to datetime
-            df_copy = st.session_state.tenders_df.copy()
-            df_copy["deadline"] = pd.to_datetime(df_copy["deadline"], errors="coerce")
-            df_copy = df_copy.sort_values("deadline")
-            
-            # Only include rows with valid deadlines
-            valid_deadlines = df_copy.dropna(subset=["deadline"])
-            if not valid_deadlines.empty:
-                deadline_counts = valid_deadlines.groupby(valid_deadlines["deadline"].dt.strftime("%Y-%m")).size()
+            if not deadline_counts.empty:
                 st.line_chart(deadline_counts)
             else:
                 st.info("No valid deadline data available")
         
-        # Top organizations
-        st.subheader("Top Organizations by Tender Count")
-        org_counts = st.session_state.tenders_df["organization"].value_counts().head(10)
-        st.bar_chart(org_counts)
+        col3, col4 = st.columns(2)
+        
+        with col3:
+            # Top organizations
+            st.subheader("Top Organizations by Tender Count")
+            st.bar_chart(org_counts)
+        
+        with col4:
+            st.subheader("Tenders by EMD Amount")
+            # A table keeps the buckets in amount order
+            st.dataframe(
+                emd_counts.rename("tenders").reset_index(),
+                use_container_width=True,
+                hide_index=True
+            )
+    
+    # Tab 4: Diagnostics
+    with tab4:
+        st.header("Pipeline Diagnostics")
+        
+        # The app's own metrics are live; other processes (the scheduler) export theirs to files
+        snapshots = {"app": metrics.export_metrics("app")}
+        snapshots.update({name: snap for name, snap in metrics.load_exported_metrics().items() if name != "app"})
+        process = st.selectbox("Process:", list(snapshots))
+        snap = snapshots[process]
+        st.caption(f"PID {snap['pid']}, started {snap['started_at']}, updated {snap['updated_at']}")
+        
+        stages, counters = metrics_tables(snap)
+        st.subheader("Stage Latency")
+        if stages.empty:
+            st.info("No stages have run in this process yet")
+        else:
+            st.dataframe(stages, use_container_width=True, hide_index=True)
+        
+        st.subheader("Counters")
+        if counters.empty:
+            st.info("No counters recorded yet")
+        else:
+            st.dataframe(counters, use_container_width=True, hide_index=True)
+        
+        st.caption(
+            f"Prometheus text files are written to {metrics.METRICS_DIR}/. "
+            "Set TENDER_PROFILE_STAGES (e.g. extract,vectorize) to sample those stages into "
+            f"collapsed-stack profiles under {metrics.PROFILER_DIR}/."
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,181 @@
+# benchmarks/corpus.py
+# Synthetic tender corpora and tender PDFs modelled on the demo records
+
+from datetime import date, timedelta
+import json
+import os
+
+import numpy as np
+
+from data_collection.scraper import CPPP_DEMO_TENDERS, GEM_DEMO_TENDERS
+
+# Constants
+PAGE_SIZE = 500          # tender records per synthetic listing page
+DUPLICATE_RATE = 0.05    # share of tenders republished on the other portal
+EXPIRED_RATE = 0.05      # share of tenders whose deadline has already passed
+PDF_LINES_PER_PAGE = 60
+PDF_WORDS_PER_LINE = 12
+
+DEMO_TENDERS = CPPP_DEMO_TENDERS + GEM_DEMO_TENDERS
+SOURCES = {
+    "CPPP": "https://etenders.gov.in/eprocure/app?tender_id={tender_id}",
+    "GeM": "https://bidplus.gem.gov.in/bid/{tender_id}",
+}
+
+# Phrase pools extending the demo titles and descriptions
+ACTIONS = [
+    "Supply of", "Development of", "Annual Maintenance Contract for", "Installation of",
+    "Procurement of", "Design and Implementation of", "Operation and Maintenance of", "Upgradation of",
+]
+SUBJECTS = [
+    "IT Equipment", "MIS System", "Data Center", "Smart City IoT Infrastructure", "Cloud Migration Services",
+    "Networking Equipment", "CCTV Surveillance System", "ERP Software", "Solar Power Plant", "Hospital Equipment",
+    "Road Construction Works", "Water Treatment Plant", "GIS Mapping Services", "Cyber Security Audit",
+    "Office Furniture", "Railway Signalling System", "Digital Classroom Solutions", "Waste Management Services",
+]
+CLIENTS = [
+    "Government Offices", "Public Distribution", "Government Applications", "District Hospitals",
+    "Municipal Corporations", "State Universities", "Police Stations", "Railway Stations", "Panchayat Offices",
+]
+ORGANIZATIONS = sorted({tender["organization"] for tender in DEMO_TENDERS} | {
+    "Ministry of Health and Family Welfare", "Ministry of Road Transport and Highways", "Indian Oil Corporation",
+    "Bharat Heavy Electricals Limited", "Delhi Metro Rail Corporation", "Airports Authority of India",
+    "Ministry of Education", "Central Public Works Department", "Oil and Natural Gas Corporation",
+})
+DESCRIPTION_TERMS = sorted({
+    word.strip(",.").lower() for tender in DEMO_TENDERS for word in tender["description"].split() if len(word) > 3
+} | {
+    "warranty", "commissioning", "training", "documentation", "integration", "monitoring", "support",
+    "deployment", "testing", "licensing", "hardware", "software", "operations", "analytics", "security",
+})
+EMD_AMOUNTS = np.arange(25_000, 1_000_001, 25_000)
+
+def generate_tender_pages(n, seed=0, page_size=PAGE_SIZE, today=None):
+    """
+    Yield n synthetic tender records in listing pages of page_size records,
+    shaped like the scrapers' demo records. Titles, organizations and
+    descriptions are drawn from the demo vocabulary, a DUPLICATE_RATE share
+    are republished on the other portal with a corrigendum, and an
+    EXPIRED_RATE share have deadlines in the past.
+    """
+    rng = np.random.RandomState(seed)
+    today = today or date.today()
+    sources = list(SOURCES)
+    
+    for start in range(0, n, page_size):
+        page = []
+        for i in range(start, min(n, start + page_size)):
+            duplicate = page and rng.rand() < DUPLICATE_RATE
+            if duplicate:
+                # Same procurement on the other portal, closing a few days later
+                original = page[rng.randint(len(page))]
+                source = sources[1 - sources.index(original["source"])]
+                title = original["title"]
+                organization = original["organization"]
+                description = original["description"] + " Corrigendum: revised bid schedule."
+                deadline = date.fromisoformat(original["deadline"]) + timedelta(days=int(rng.randint(1, 15)))
+                emd = original["emd_amount"]
+            else:
+                source = sources[rng.randint(len(sources))]
+                title = f"{ACTIONS[rng.randint(len(ACTIONS))]} {SUBJECTS[rng.randint(len(SUBJECTS))]} " \
+                        f"for {CLIENTS[rng.randint(len(CLIENTS))]}"
+                organization = ORGANIZATIONS[rng.randint(len(ORGANIZATIONS))]
+                words = rng.choice(DESCRIPTION_TERMS, size=rng.randint(8, 25))
+                description = f"{title} including " + " ".join(words)
+                days = -int(rng.randint(1, 60)) if rng.rand() < EXPIRED_RATE else int(rng.randint(1, 365))
+                deadline = today + timedelta(days=days)
+                emd = f"₹{EMD_AMOUNTS[rng.randint(len(EMD_AMOUNTS))]:,}"
+            
+            tender_id = f"{source}-SYN-{i:07d}"
+            page.append({
+                "tender_id": tender_id,
+                "title": title,
+                "organization": organization,
+                "deadline": deadline.isoformat(),
+                "emd_amount": emd,
+                "description": description,
+                "source": source,
+                "url": SOURCES[source].format(tender_id=tender_id)
+            })
+        yield page
+
+def write_corpus(n, path, seed=0, page_size=PAGE_SIZE):
+    """Write a synthetic corpus to a JSON lines file, one listing page per line"""
+    with open(path, "w", encoding="utf-8") as f:
+        for page in generate_tender_pages(n, seed, page_size):
+            f.write(json.dumps(page) + "\n")
+    return path
+
+def iter_corpus_pages(path):
+    """Yield the listing pages of a corpus written by write_corpus()"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def _pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def write_pdf(path, pages):
+    """
+    Write a minimal PDF with one Helvetica text line per entry of each page
+    (pages is a list of lists of lines). Only latin-1 text is supported.
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        content = "BT /F1 9 Tf 36 806 Td 12 TL " + " ".join(f"{_pdf_string(line)} '" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream")
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+def _filler_lines(rng, n_lines):
+    words = rng.choice(DESCRIPTION_TERMS, size=(n_lines, PDF_WORDS_PER_LINE))
+    return [" ".join(line).capitalize() + "." for line in words]
+
+def generate_pdfs(n, out_dir, pages_per_doc=5, seed=0):
+    """
+    Write n synthetic tender documents of pages_per_doc pages each to out_dir.
+    Each carries the fields extract_key_details() looks for (EMD, submission
+    date, scope of work, eligibility criteria), split between the first and
+    last pages so the whole document is read. Returns the file paths.
+    """
+    rng = np.random.RandomState(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    tenders = next(generate_tender_pages(n, seed, page_size=n)) if n else []
+    paths = []
+    for i, tender in enumerate(tenders):
+        pages = [_filler_lines(rng, PDF_LINES_PER_PAGE) for _ in range(pages_per_doc)]
+        emd = tender["emd_amount"].replace("₹", "Rs. ")
+        deadline = date.fromisoformat(tender["deadline"]).strftime("%d/%m/%Y")
+        pages[0][:4] = [
+            f"Tender Document: {tender['title']}",
+            f"Issued by {tender['organization']}",
+            f"EMD Amount: {emd}",
+            f"Bid Submission Date: {deadline}",
+        ]
+        # The scope and eligibility values run over the following lines
+        pages[-1][0] = "Scope of Work: " + pages[-1][0]
+        pages[-1][10] = "Eligibility Criteria: " + pages[-1][10]
+        path = os.path.join(out_dir, f"tender-{i:05d}.pdf")
+        write_pdf(path, pages)
+        paths.append(path)
+    return paths
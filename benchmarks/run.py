@@ -0,0 +1,266 @@
+# benchmarks/run.py
+# Benchmark suite timing ingestion, matching, extraction and dashboard aggregation on synthetic corpora
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+# Add project root to path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from benchmarks import corpus
+from data_collection.scraper import SCRAPERS, register_scraper, get_all_tenders
+from data_processing.processor import extract_text_from_pdf, extract_key_details
+from recommendation.matcher import train_vectorizer, match_profile_to_tenders
+from storage import tender_store
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_SIZES = [10_000, 100_000]  # tender records per synthetic corpus
+DEFAULT_PDFS = 10
+PDF_PAGES = 5
+EXTRACT_REPEAT = 100  # passes over the document texts, so key detail extraction is long enough to time
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "benchmarks", "results")
+MEMORY_SAMPLE_INTERVAL = 0.005  # seconds between RSS samples while a stage runs
+REGRESSION_THRESHOLD = 1.2  # a stage this many times slower than the baseline is a regression
+BENCH_PORTAL = "Synthetic"
+PROFILE_TEXT = (
+    "We provide cloud migration, data center maintenance, networking equipment supply "
+    "and MIS software development for government offices and public sector units"
+)
+
+def _rss_bytes():
+    """Resident set size of this process (Linux), None when unknown"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class PeakMemory:
+    """Samples the process RSS on a background thread and keeps the peak"""
+    
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start = None
+        self.peak = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+    
+    def _sample(self):
+        while not self.stop_event.wait(self.interval):
+            rss = _rss_bytes()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+    
+    def __enter__(self):
+        self.start = self.peak = _rss_bytes()
+        if self.start is not None:
+            self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        rss = _rss_bytes()
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+        return False
+
+def measure(stages, name, func, *args, items=None, **kwargs):
+    """
+    Run one stage, recording its wall time, peak RSS and RSS growth (in MB)
+    under stages[name]. items, a count or a function of the result, adds a
+    throughput. Returns the stage's result.
+    """
+    gc.collect()
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    
+    stage = {"seconds": round(seconds, 4)}
+    if memory.start is not None:
+        stage["peak_rss_mb"] = round(memory.peak / 2**20, 1)
+        stage["rss_growth_mb"] = round((memory.peak - memory.start) / 2**20, 1)
+    if items is not None:
+        count = items(result) if callable(items) else items
+        stage["items"] = count
+        stage["items_per_second"] = round(count / seconds, 1) if seconds else None
+    stages[name] = stage
+    logger.info(f"{name}: {seconds:.3f}s")
+    return result
+
+def iter_corpus_tenders(session=None, url=None, http_cache=None):
+    """Scraper serving a synthetic corpus file as listing pages"""
+    yield from corpus.iter_corpus_pages(url)
+
+def dashboard_rollups():
+    """Read every dashboard rollup, as the app's dashboard tab does"""
+    return {dimension: tender_store.get_rollup(dimension) for dimension in tender_store.ROLLUP_DIMENSIONS}
+
+def run_corpus(size, seed=0):
+    """
+    Benchmark ingestion, vectorizer training, matching and the dashboard on a
+    synthetic corpus of size tenders, in the current directory's data/ store.
+    Returns the stage results.
+    """
+    os.makedirs(tender_store.DATA_DIR, exist_ok=True)
+    corpus_file = corpus.write_corpus(size, os.path.abspath(os.path.join(tender_store.DATA_DIR, "corpus.jsonl")), seed)
+    register_scraper(BENCH_PORTAL, corpus_file)(iter_corpus_tenders)
+    stages = {}
+    try:
+        measure(stages, "get_all_tenders", get_all_tenders, portals=[BENCH_PORTAL], items=size)
+        measure(stages, "get_all_tenders_unchanged", get_all_tenders, portals=[BENCH_PORTAL], items=size)
+        tenders_df = tender_store.query_tenders(canonical_only=True, active_only=True)
+        
+        train_df = tender_store.query_tenders(columns=["tender_id", "title", "description", "content_hash"])
+        for kind, incremental in (("tfidf", False), ("incremental", True)):
+            vectorizer = measure(stages, f"train_vectorizer_{kind}", train_vectorizer, train_df,
+                                 incremental=incremental, items=len(train_df))
+            measure(stages, f"match_profile_to_tenders_{kind}", match_profile_to_tenders,
+                    PROFILE_TEXT, tenders_df, vectorizer, items=len(tenders_df))
+        
+        measure(stages, "dashboard_rollups", dashboard_rollups)
+    finally:
+        SCRAPERS.pop(BENCH_PORTAL, None)
+    return stages
+
+def run_documents(n_pdfs, pages=PDF_PAGES, seed=0):
+    """Benchmark PDF text extraction and key detail extraction on synthetic documents"""
+    paths = corpus.generate_pdfs(n_pdfs, os.path.join(tender_store.DATA_DIR, "pdfs"), pages, seed)
+    stages = {}
+    texts = measure(stages, "extract_text_from_pdf", lambda: [extract_text_from_pdf(path) for path in paths],
+                    items=n_pdfs * pages)
+    measure(stages, "extract_key_details", lambda: [extract_key_details(text) for text in texts * EXTRACT_REPEAT],
+            items=n_pdfs * EXTRACT_REPEAT)
+    return stages
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes=DEFAULT_SIZES, n_pdfs=DEFAULT_PDFS, seed=0, workdir=None):
+    """
+    Run the suite in a scratch directory (a fresh tender store per corpus
+    size) and return the results, tagged with the commit and platform
+    """
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "corpus": [],
+        "documents": None
+    }
+    
+    scratch = workdir or tempfile.mkdtemp(prefix="tender-bench-")
+    cwd = os.getcwd()
+    try:
+        for size in sizes:
+            size_dir = os.path.join(scratch, f"corpus-{size}")
+            os.makedirs(size_dir, exist_ok=True)
+            os.chdir(size_dir)
+            logger.info(f"Benchmarking a corpus of {size} tenders")
+            results["corpus"].append({"size": size, "stages": run_corpus(size, seed)})
+            os.chdir(cwd)
+        
+        if n_pdfs:
+            documents_dir = os.path.join(scratch, "documents")
+            os.makedirs(documents_dir, exist_ok=True)
+            os.chdir(documents_dir)
+            logger.info(f"Benchmarking extraction on {n_pdfs} documents")
+            results["documents"] = {"count": n_pdfs, "pages": PDF_PAGES, "stages": run_documents(n_pdfs, seed=seed)}
+    finally:
+        os.chdir(cwd)
+        if workdir is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+def _stage_times(results):
+    times = {}
+    for run in results.get("corpus", []):
+        for name, stage in run["stages"].items():
+            times[f"{name}@{run['size']}"] = stage["seconds"]
+    for name, stage in ((results.get("documents") or {}).get("stages") or {}).items():
+        times[f"{name}@{results['documents']['count']}docs"] = stage["seconds"]
+    return times
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare stage times with a baseline run. Returns (report lines, regressions),
+    where regressions are the stages at least threshold times slower.
+    """
+    current, previous = _stage_times(results), _stage_times(baseline)
+    lines = [f"Compared with {baseline.get('commit') or 'baseline'} from {baseline.get('started_at')}:"]
+    regressions = []
+    for key, seconds in current.items():
+        if key not in previous:
+            continue
+        ratio = seconds / previous[key] if previous[key] else float("inf")
+        flag = ""
+        if ratio >= threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        lines.append(f"  {key:<45} {previous[key]:>9.3f}s -> {seconds:>9.3f}s  x{ratio:.2f}{flag}")
+    return lines, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tender pipeline on synthetic corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="tender records per synthetic corpus (e.g. 10000 100000 1000000)")
+    parser.add_argument("--pdfs", type=int, default=DEFAULT_PDFS, help="synthetic PDFs for the extraction stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare with; exits 1 on regressions")
+    parser.add_argument("--workdir", help="keep the generated stores and PDFs in this directory")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    # Stage progress only; the pipeline's own logging would swamp it
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+    
+    results = run_benchmarks(args.sizes, args.pdfs, args.seed, args.workdir)
+    
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{(results['commit'] or 'nocommit')[:8]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            lines, regressions = compare_results(results, json.load(f))
+        print("\n".join(lines))
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
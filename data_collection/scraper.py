@@ -2,136 +2,387 @@
 # Web scraping module for government tender portals
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urljoin
 import pandas as pd
+import threading
+import queue
+import json
 import logging
 import os
 import pickle
 
+from storage import tender_store
+from data_processing.dedup import deduplicate_store
+from monitoring import metrics
+
 logger = logging.getLogger(__name__)
 
 # Constants
 DATA_DIR = "data"
-TENDERS_FILE = os.path.join(DATA_DIR, "tenders.pkl")
+HTTP_CACHE_FILE = os.path.join(DATA_DIR, "http_cache.json")
+
+# HTTP settings shared by all portal scrapers
+REQUEST_TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_WORKERS = 8
+PER_HOST_LIMIT = 2
+USER_AGENT = "tender-tracker/1.0"
+
+# Streaming ingestion settings
+MAX_PAGES = 500          # safety cap on listing pages followed per portal
+PAGE_QUEUE_SIZE = 16     # pages buffered between scraper threads and the consumer
+BATCH_SIZE = 500         # tender records per batch handed to the storage sink
+SCRAPE_INTERVAL = 3600   # default seconds between scheduled scrapes of a portal
+
+# Registry of portal scrapers: name -> {"url": listing url, "func": page generator}
+SCRAPERS = {}
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
 
-def scrape_cppp_tenders():
+def register_scraper(name, url, interval=SCRAPE_INTERVAL):
     """
-    Scrape tenders from Central Public Procurement Portal (CPPP)
-    Returns a dataframe with tender details
+    Register a portal scraper under a name together with its listing URL and
+    the seconds between scheduled scrapes (see scheduler/worker.py).
+    The scraper is called as func(session=..., url=..., http_cache=...) and yields
+    one list of tender records per listing page.
     """
-    logger.info("Scraping CPPP tenders...")
+    def decorator(func):
+        SCRAPERS[name] = {"url": url, "func": func, "interval": interval}
+        return func
+    return decorator
+
+def create_session(pool_size=MAX_WORKERS):
+    """Create a pooled keep-alive HTTP session with retry and backoff"""
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
     
-    url = "https://etenders.gov.in/eprocure/app"
-    try:
-        # In a real implementation, you might need to navigate through multiple pages
-        # This is a simplified version for demonstration
-        page = requests.get(url)
-        soup = BeautifulSoup(page.content, "html.parser")
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _get_host_semaphore(url):
+    """Return the semaphore limiting concurrent requests to the host of a URL"""
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return _host_semaphores[host]
+
+def fetch_page(url, session=None, **kwargs):
+    """
+    Fetch a page with the shared timeout, honouring the per-host concurrency limit
+    """
+    session = session or create_session()
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    with _get_host_semaphore(url):
+        with metrics.timed("scrape"):
+            response = session.get(url, **kwargs)
+    metrics.increment("pages_fetched", host=urlparse(url).netloc, status=response.status_code)
+    response.raise_for_status()
+    return response
+
+def load_http_cache():
+    """Load the per-URL ETag/Last-Modified validators from the last crawl"""
+    if os.path.exists(HTTP_CACHE_FILE):
+        with open(HTTP_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_http_cache(http_cache):
+    """Save the per-URL validators for the next incremental crawl"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_file = HTTP_CACHE_FILE + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(http_cache, f)
+    os.replace(tmp_file, HTTP_CACHE_FILE)
+
+def iter_listing_pages(url, session=None, max_pages=MAX_PAGES, http_cache=None):
+    """
+    Follow a portal's paginated listing, yielding (page_number, soup) per page.
+    Pagination follows the rel="next" link until it disappears or max_pages is hit.
+    
+    When an http_cache dict is given, pages are requested with If-None-Match /
+    If-Modified-Since. Unchanged pages (304) yield soup=None and pagination
+    continues from the next link remembered for that page.
+    """
+    session = session or create_session()
+    page_number = 0
+    while url and page_number < max_pages:
+        cached = http_cache.get(url, {}) if http_cache is not None else {}
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        
+        page = fetch_page(url, session, headers=headers)
+        page_number += 1
         
-        # Extract tender info (this will need to be customized based on actual website structure)
-        tenders = []
+        if page.status_code == 304:
+            yield page_number, None
+            url = cached.get("next_url")
+            continue
         
-        # Demo data since actual scraping depends on site structure
-        # In a real implementation, you'd parse the HTML to extract this info
-        demo_tenders = [
-            {
-                "tender_id": "CPPP-2025-001",
-                "title": "Supply of IT Equipment for Government Offices",
-                "organization": "Ministry of Electronics and IT",
-                "deadline": "2025-05-15",
-                "emd_amount": "₹150,000",
-                "description": "Supply and installation of computers, printers and networking equipment",
-                "source": "CPPP",
-                "url": "https://etenders.gov.in/eprocure/app?tender_id=CPPP-2025-001"
-            },
-            {
-                "tender_id": "CPPP-2025-002",
-                "title": "Development of MIS System for Public Distribution",
-                "organization": "Food Corporation of India",
-                "deadline": "2025-05-20",
-                "emd_amount": "₹200,000",
-                "description": "Design and development of management information system for tracking public distribution operations",
-                "source": "CPPP",
-                "url": "https://etenders.gov.in/eprocure/app?tender_id=CPPP-2025-002"
+        soup = BeautifulSoup(page.content, "html.parser")
+        next_link = soup.find("a", rel="next")
+        next_url = urljoin(url, next_link["href"]) if next_link and next_link.get("href") else None
+        
+        if http_cache is not None:
+            http_cache[url] = {
+                "etag": page.headers.get("ETag"),
+                "last_modified": page.headers.get("Last-Modified"),
+                "next_url": next_url
             }
-        ]
         
-        tenders.extend(demo_tenders)
-        return pd.DataFrame(tenders)
+        yield page_number, soup
+        url = next_url
+
+@register_scraper("CPPP", "https://etenders.gov.in/eprocure/app")
+def iter_cppp_tenders(session=None, url=None, http_cache=None):
+    """
+    Scrape tenders from Central Public Procurement Portal (CPPP)
+    Yields a list of tender records per listing page
+    """
+    logger.info("Scraping CPPP tenders...")
+    
+    url = url or SCRAPERS["CPPP"]["url"]
+    try:
+        for page_number, soup in iter_listing_pages(url, session, http_cache=http_cache):
+            # Extract tender info (this will need to be customized based on actual website structure)
+            # Demo data until then; in a real implementation, you'd parse the HTML of each page
+            yield CPPP_DEMO_TENDERS if page_number == 1 and soup is not None else []
     
     except Exception as e:
         logger.error(f"Error scraping CPPP: {str(e)}")
-        return pd.DataFrame()
 
-def scrape_gem_tenders():
+def scrape_cppp_tenders(session=None, url=None):
     """
-    Scrape tenders from Government e-Marketplace (GeM)
+    Scrape tenders from Central Public Procurement Portal (CPPP)
     Returns a dataframe with tender details
     """
+    return collect_tenders(iter_cppp_tenders(session, url))
+
+# Demo data since actual scraping depends on site structure
+CPPP_DEMO_TENDERS = [
+    {
+        "tender_id": "CPPP-2025-001",
+        "title": "Supply of IT Equipment for Government Offices",
+        "organization": "Ministry of Electronics and IT",
+        "deadline": "2025-05-15",
+        "emd_amount": "₹150,000",
+        "description": "Supply and installation of computers, printers and networking equipment",
+        "source": "CPPP",
+        "url": "https://etenders.gov.in/eprocure/app?tender_id=CPPP-2025-001"
+    },
+    {
+        "tender_id": "CPPP-2025-002",
+        "title": "Development of MIS System for Public Distribution",
+        "organization": "Food Corporation of India",
+        "deadline": "2025-05-20",
+        "emd_amount": "₹200,000",
+        "description": "Design and development of management information system for tracking public distribution operations",
+        "source": "CPPP",
+        "url": "https://etenders.gov.in/eprocure/app?tender_id=CPPP-2025-002"
+    }
+]
+
+@register_scraper("GeM", "https://bidplus.gem.gov.in/all-bids", interval=1800)
+def iter_gem_tenders(session=None, url=None, http_cache=None):
+    """
+    Scrape tenders from Government e-Marketplace (GeM)
+    Yields a list of tender records per listing page
+    """
     logger.info("Scraping GeM tenders...")
     
-    url = "https://bidplus.gem.gov.in/all-bids"
+    url = url or SCRAPERS["GeM"]["url"]
     try:
-        # In a real implementation, you'd need to navigate through pages
-        # This is a simplified version for demonstration
-        page = requests.get(url)
-        soup = BeautifulSoup(page.content, "html.parser")
-        
-        # Demo data since actual scraping depends on site structure
-        demo_tenders = [
-            {
-                "tender_id": "GEM-2025-B-001",
-                "title": "Annual Maintenance Contract for Data Center",
-                "organization": "National Informatics Centre",
-                "deadline": "2025-05-10",
-                "emd_amount": "₹300,000",
-                "description": "Comprehensive maintenance of servers, storage and network infrastructure",
-                "source": "GeM",
-                "url": "https://bidplus.gem.gov.in/bid/GEM-2025-B-001"
-            },
-            {
-                "tender_id": "GEM-2025-B-002",
-                "title": "Smart City IoT Infrastructure Development",
-                "organization": "Smart Cities Mission",
-                "deadline": "2025-05-25",
-                "emd_amount": "₹500,000",
-                "description": "Development of IoT sensors and analytics platform for traffic management, waste management and public safety",
-                "source": "GeM",
-                "url": "https://bidplus.gem.gov.in/bid/GEM-2025-B-002"
-            },
-            {
-                "tender_id": "GEM-2025-B-003",
-                "title": "Cloud Migration Services for Government Applications",
-                "organization": "Ministry of Railways",
-                "deadline": "2025-06-05",
-                "emd_amount": "₹250,000",
-                "description": "Migration of legacy applications to cloud infrastructure with data security and performance optimization",
-                "source": "GeM",
-                "url": "https://bidplus.gem.gov.in/bid/GEM-2025-B-003"
-            }
-        ]
-        
-        return pd.DataFrame(demo_tenders)
+        for page_number, soup in iter_listing_pages(url, session, http_cache=http_cache):
+            # Demo data since actual scraping depends on site structure
+            yield GEM_DEMO_TENDERS if page_number == 1 and soup is not None else []
     
     except Exception as e:
         logger.error(f"Error scraping GeM: {str(e)}")
-        return pd.DataFrame()
 
-def get_all_tenders():
+def scrape_gem_tenders(session=None, url=None):
+    """
+    Scrape tenders from Government e-Marketplace (GeM)
+    Returns a dataframe with tender details
+    """
+    return collect_tenders(iter_gem_tenders(session, url))
+
+# Demo data since actual scraping depends on site structure
+GEM_DEMO_TENDERS = [
+    {
+        "tender_id": "GEM-2025-B-001",
+        "title": "Annual Maintenance Contract for Data Center",
+        "organization": "National Informatics Centre",
+        "deadline": "2025-05-10",
+        "emd_amount": "₹300,000",
+        "description": "Comprehensive maintenance of servers, storage and network infrastructure",
+        "source": "GeM",
+        "url": "https://bidplus.gem.gov.in/bid/GEM-2025-B-001"
+    },
+    {
+        "tender_id": "GEM-2025-B-002",
+        "title": "Smart City IoT Infrastructure Development",
+        "organization": "Smart Cities Mission",
+        "deadline": "2025-05-25",
+        "emd_amount": "₹500,000",
+        "description": "Development of IoT sensors and analytics platform for traffic management, waste management and public safety",
+        "source": "GeM",
+        "url": "https://bidplus.gem.gov.in/bid/GEM-2025-B-002"
+    },
+    {
+        "tender_id": "GEM-2025-B-003",
+        "title": "Cloud Migration Services for Government Applications",
+        "organization": "Ministry of Railways",
+        "deadline": "2025-06-05",
+        "emd_amount": "₹250,000",
+        "description": "Migration of legacy applications to cloud infrastructure with data security and performance optimization",
+        "source": "GeM",
+        "url": "https://bidplus.gem.gov.in/bid/GEM-2025-B-003"
+    }
+]
+
+def collect_tenders(pages):
+    """Collect the records yielded page by page into a single dataframe"""
+    return pd.DataFrame([record for page in pages for record in page])
+
+def iter_tender_pages(portals=None, session=None, max_workers=MAX_WORKERS, http_cache=None):
     """
-    Aggregate tenders from all sources and save to pickle file
+    Run the registered portal scrapers concurrently on a bounded thread pool and
+    yield (portal, records) for each listing page as soon as it is parsed.
+    Pages pass through a bounded queue, so scraper threads wait for the consumer
+    instead of buffering a whole crawl in memory.
+    """
+    names = list(portals or SCRAPERS)
+    if not names:
+        return
+    
+    session = session or create_session(pool_size=max_workers)
+    pages = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+    
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def run(name):
+        scraper = SCRAPERS[name]
+        try:
+            for records in scraper["func"](session=session, url=scraper["url"], http_cache=http_cache):
+                if records and not put((name, records)):
+                    return
+        except Exception as e:
+            logger.error(f"Scraper {name} failed: {str(e)}")
+        finally:
+            put((name, done))
+    
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(names)))
+    try:
+        for name in names:
+            executor.submit(run, name)
+        
+        remaining = len(names)
+        while remaining:
+            name, records = pages.get()
+            if records is done:
+                remaining -= 1
+            else:
+                yield name, records
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+def iter_tender_batches(portals=None, batch_size=BATCH_SIZE, session=None, http_cache=None):
+    """
+    Yield dataframes of at most batch_size tender records, streaming pages
+    from all portals as they arrive
+    """
+    batch = []
+    for _, records in iter_tender_pages(portals, session, http_cache=http_cache):
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch)
+                batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+def ingest_tenders(sink, portals=None, batch_size=BATCH_SIZE, session=None, http_cache=None):
+    """
+    Stream tenders from all portals into sink(batch_df) in bounded batches.
+    Returns the number of tender records ingested.
+    """
+    total = 0
+    for batch_df in iter_tender_batches(portals, batch_size, session, http_cache):
+        sink(batch_df)
+        total += len(batch_df)
+        logger.info(f"Ingested {total} tenders so far...")
+    return total
+
+def get_all_tenders(portals=None, incremental=False):
+    """
+    Aggregate tenders from all sources into the tender store
+    
+    Batches are upserted by tender_id as they arrive, so only new or changed
+    tenders are written. In incremental mode unchanged listing pages are also
+    skipped with conditional requests. Near-duplicates (the same procurement on
+    several portals, or republished after a corrigendum) are then linked to a
+    canonical record, and tenders whose deadline has passed are archived.
+    Returns the refresh stats: counts of new, updated, unchanged, archived and
+    duplicate tenders, and of the open canonical tenders now in the store
+    ("open"). Read the tenders themselves with tender_store.query_tenders().
     """
     logger.info("Aggregating tenders from all sources...")
     
-    # Get tenders from different sources
-    cppp_tenders = scrape_cppp_tenders()
-    gem_tenders = scrape_gem_tenders()
+    http_cache = None
+    if incremental:
+        # Validators are useless without the tenders they were recorded for
+        http_cache = load_http_cache() if tender_store.count_tenders() else {}
     
-    # Combine all tenders
-    all_tenders = pd.concat([cppp_tenders, gem_tenders], ignore_index=True)
+    stats = {"new": 0, "updated": 0, "unchanged": 0}
     
-    # Save tenders to pickle file
-    os.makedirs(DATA_DIR, exist_ok=True)
-    all_tenders.to_pickle(TENDERS_FILE)
+    def upsert_batch(batch_df):
+        with metrics.timed("upsert"):
+            counts = tender_store.upsert_tenders(batch_df)
+        for key, count in counts.items():
+            stats[key] += count
+            metrics.increment("tenders_upserted", count, result=key)
+    
+    # Stream tenders from all registered sources concurrently into the store
+    with metrics.timed("ingest"):
+        ingest_tenders(upsert_batch, portals, http_cache=http_cache)
+    logger.info(f"Refresh stats: {stats['new']} new, {stats['updated']} updated, {stats['unchanged']} unchanged")
+    
+    if http_cache is not None:
+        save_http_cache(http_cache)
+    
+    with metrics.timed("archive"):
+        stats["archived"] = tender_store.archive_expired()
+    with metrics.timed("dedup"):
+        stats["duplicates"] = deduplicate_store()
     
-    return all_tenders
\ No newline at end of file
+    stats["open"] = tender_store.count_tenders(canonical_only=True, active_only=True)
+    return stats
@@ -0,0 +1,175 @@
+# data_processing/dedup.py
+# Near-duplicate tender detection with MinHash signatures and LSH banding
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+import numpy as np
+import pandas as pd
+import logging
+
+from storage import tender_store
+
+logger = logging.getLogger(__name__)
+
+# Constants
+NUM_PERM = 128  # MinHash permutations per signature
+LSH_BANDS = 16  # bands of LSH_ROWS rows; candidates share at least one band
+LSH_ROWS = NUM_PERM // LSH_BANDS
+DUPLICATE_THRESHOLD = 0.8  # estimated Jaccard similarity for two tenders to be duplicates
+SHINGLE_SIZE = 2  # words per shingle
+SIGNATURE_CHUNK = 256  # tenders hashed at once, bounds the (shingles x permutations) buffer
+DEDUP_FIELDS = ["title", "organization", "description"]
+
+_EMPTY = np.iinfo(np.uint32).max
+_SHIFT = np.uint64(32)
+
+# Fixed multiply-shift hash functions (odd multipliers), so stored signatures
+# stay comparable between runs
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(0, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+_PERM_B = _rng.randint(0, np.iinfo(np.int64).max, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+_shingler = HashingVectorizer(
+    ngram_range=(SHINGLE_SIZE, SHINGLE_SIZE), n_features=(1 << 31) - 1,
+    alternate_sign=False, norm=None, binary=True, dtype=np.float32
+)
+
+def _dedup_texts(tenders_df):
+    fields = [tenders_df[field].astype(object).fillna("").astype(str) for field in DEDUP_FIELDS if field in tenders_df]
+    return fields[0].str.cat(fields[1:], sep=" ").tolist()
+
+def minhash_signatures(texts):
+    """
+    MinHash signatures (n_texts x NUM_PERM, uint32) over word shingles.
+    Texts with no shingles get a signature of all _EMPTY.
+    """
+    shingles = sparse.csr_matrix(_shingler.transform(texts))
+    signatures = np.full((shingles.shape[0], NUM_PERM), _EMPTY, dtype=np.uint32)
+    
+    for start in range(0, shingles.shape[0], SIGNATURE_CHUNK):
+        chunk = shingles[start:start + SIGNATURE_CHUNK]
+        if not chunk.nnz:
+            continue
+        ids = chunk.indices.astype(np.uint64)[:, None]
+        # Products wrap modulo 2**64; the high 32 bits are the hash
+        hashes = ((ids * _PERM_A + _PERM_B) >> _SHIFT).astype(np.uint32)
+        
+        # Minimum hash per row; rows without shingles keep _EMPTY
+        non_empty = np.diff(chunk.indptr) > 0
+        minima = np.minimum.reduceat(hashes, chunk.indptr[:-1][non_empty], axis=0)
+        signatures[start:start + chunk.shape[0]][non_empty] = minima
+    return signatures
+
+def candidate_pairs(signatures):
+    """
+    Candidate duplicate pairs from LSH banding: tenders whose signatures agree
+    on every row of some band land in the same bucket. Each bucket member is
+    paired with the bucket's first member only, so the number of pairs stays
+    linear in the corpus size. Returns two index arrays.
+    """
+    valid = np.flatnonzero((signatures != _EMPTY).any(axis=1))
+    firsts, seconds = [], []
+    for band in range(LSH_BANDS):
+        rows = np.ascontiguousarray(signatures[valid, band * LSH_ROWS:(band + 1) * LSH_ROWS])
+        # One opaque key per band so buckets can be found with a single sort
+        keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * LSH_ROWS))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        shared = counts[bucket] > 1
+        if not shared.any():
+            continue
+        members = valid[shared]
+        bucket = bucket[shared]
+        order = np.argsort(bucket, kind="stable")
+        members, bucket = members[order], bucket[order]
+        heads = members[np.searchsorted(bucket, bucket)]
+        keep = heads != members
+        firsts.append(heads[keep])
+        seconds.append(members[keep])
+    
+    if not firsts:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    pairs = np.unique(np.column_stack([np.concatenate(firsts), np.concatenate(seconds)]), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+def _canonical_order(tenders_df):
+    """
+    Rank tenders for picking a cluster's canonical record: the latest deadline
+    first (a republished corrigendum supersedes the original), then tender_id
+    """
+    deadlines = pd.to_datetime(tenders_df["deadline_date"], errors="coerce") if "deadline_date" in tenders_df \
+        else pd.Series(pd.NaT, index=tenders_df.index)
+    ranking = pd.DataFrame({
+        "deadline": deadlines.to_numpy(),
+        "tender_id": tenders_df["tender_id"].to_numpy()
+    })
+    return ranking.sort_values(["deadline", "tender_id"], ascending=[False, True], na_position="last").index.to_numpy()
+
+def cluster_duplicates(tenders_df, signatures=None, threshold=DUPLICATE_THRESHOLD):
+    """
+    Cluster near-duplicate tenders. Candidate pairs from LSH are confirmed when
+    their estimated Jaccard similarity reaches the threshold, and connected
+    tenders form a cluster. Returns a dict of alias tender_id -> canonical tender_id.
+    """
+    if signatures is None:
+        signatures = minhash_signatures(_dedup_texts(tenders_df))
+    
+    firsts, seconds = candidate_pairs(signatures)
+    if len(firsts):
+        similarity = (signatures[firsts] == signatures[seconds]).mean(axis=1)
+        confirmed = similarity >= threshold
+        firsts, seconds = firsts[confirmed], seconds[confirmed]
+    if not len(firsts):
+        return {}
+    
+    n = len(tenders_df)
+    graph = sparse.coo_matrix((np.ones(len(firsts), dtype=np.int8), (firsts, seconds)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    
+    # The first tender of each cluster in canonical order is its canonical record
+    order = _canonical_order(tenders_df)
+    clusters, first = np.unique(labels[order], return_index=True)
+    canonical = np.empty(labels.max() + 1, dtype=np.intp)
+    canonical[clusters] = order[first]
+    canonical_rows = canonical[labels]
+    
+    tender_ids = tenders_df["tender_id"].to_numpy()
+    is_alias = canonical_rows != np.arange(n)
+    return dict(zip(tender_ids[is_alias], tender_ids[canonical_rows[is_alias]]))
+
+def deduplicate_store(threshold=DUPLICATE_THRESHOLD, db_path=tender_store.TENDERS_DB):
+    """
+    Cluster the stored tenders and record each cluster's aliases against its
+    canonical record. Signatures are only computed for new or changed tenders.
+    Returns the number of aliases.
+    """
+    tenders_df = tender_store.query_tenders(
+        columns=["tender_id", "content_hash", "deadline_date"] + DEDUP_FIELDS, db_path=db_path
+    )
+    if tenders_df.empty:
+        tender_store.replace_aliases({}, db_path)
+        return 0
+    
+    stored = tender_store.get_signatures(db_path)
+    signatures = np.empty((len(tenders_df), NUM_PERM), dtype=np.uint32)
+    missing = []
+    for position, tender_id in enumerate(tenders_df["tender_id"]):
+        signature = stored.get(tender_id)
+        if signature is None:
+            missing.append(position)
+        else:
+            signatures[position] = np.frombuffer(signature, dtype=np.uint32)
+    
+    if missing:
+        new_rows = tenders_df.iloc[missing]
+        signatures[missing] = minhash_signatures(_dedup_texts(new_rows))
+        tender_store.save_signatures(
+            [(tender_id, content_hash, signatures[position].tobytes())
+             for position, tender_id, content_hash in zip(missing, new_rows["tender_id"], new_rows["content_hash"])],
+            db_path
+        )
+    
+    aliases = cluster_duplicates(tenders_df, signatures, threshold)
+    if tender_store.replace_aliases(aliases, db_path):
+        logger.info(f"Deduplication linked {len(aliases)} duplicate tenders to canonical records")
+    return len(aliases)
@@ -0,0 +1,156 @@
+# data_processing/doc_cache.py
+# Content-addressed on-disk cache for extracted document text and details
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = "data"
+DOC_CACHE_DIR = os.path.join(DATA_DIR, "doc_cache")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+INDEX_NAME = "index.db"
+SQLITE_TIMEOUT = 30  # seconds to wait for another process's write lock
+
+# Entry sizes and last use, so a put updates a running total instead of
+# walking the cache directory; entries are evicted only when it is over the limit
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_used_at ON entries(used_at);
+CREATE TABLE IF NOT EXISTS cache_size (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+"""
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(path, namespace):
+    """
+    Key a file by its content and a namespace naming the extractor version
+    and options, so renamed or re-uploaded copies hit the same entry
+    """
+    return hashlib.sha256(f"{namespace}:{file_digest(path)}".encode("utf-8")).hexdigest()
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+def _open_index(cache_dir):
+    """Open the cache index, indexing the entries already on disk the first time"""
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, INDEX_NAME), timeout=SQLITE_TIMEOUT)
+    conn.executescript(INDEX_SCHEMA)
+    if conn.execute("SELECT 1 FROM cache_size").fetchone() is None:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM cache_size").fetchone() is None:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, size, used_at) VALUES (?, ?, ?)", _scan_entries(cache_dir)
+                )
+                conn.execute("INSERT INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+    return conn
+
+def _scan_entries(cache_dir):
+    """(key, size, mtime) of every entry file; only used to build the index"""
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            yield name[:-len(".json")], stat.st_size, stat.st_mtime
+
+def get_cached(key, cache_dir=DOC_CACHE_DIR):
+    """Return the cached entry for a key, or None. Hits refresh the entry's LRU position."""
+    entry_path = _entry_path(key, cache_dir)
+    try:
+        with open(entry_path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache entry {entry_path}: {str(e)}")
+        return None
+    
+    try:
+        conn = _open_index(cache_dir)
+        try:
+            with conn:
+                conn.execute("UPDATE entries SET used_at = ? WHERE key = ?", (time.time(), key))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not update the cache index: {str(e)}")
+    return entry
+
+def put_cached(key, entry, cache_dir=DOC_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Store an entry atomically, then evict least recently used entries if the cache is over max_bytes"""
+    entry_path = _entry_path(key, cache_dir)
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, entry_path)
+    
+    conn = _open_index(cache_dir)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT INTO entries (key, size, used_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET size = excluded.size, used_at = excluded.used_at",
+                (key, size, time.time())
+            )
+            conn.execute("UPDATE cache_size SET total = total + ?", (size - (previous[0] if previous else 0),))
+            _evict_over(conn, cache_dir, max_bytes)
+    finally:
+        conn.close()
+
+def _evict_over(conn, cache_dir, max_bytes):
+    """Delete least recently used entries until the indexed total fits in max_bytes, in the caller's transaction"""
+    total = conn.execute("SELECT total FROM cache_size").fetchone()[0]
+    if total <= max_bytes:
+        return
+    evicted = []
+    for key, size in conn.execute("SELECT key, size FROM entries ORDER BY used_at"):
+        try:
+            os.remove(_entry_path(key, cache_dir))
+        except FileNotFoundError:
+            pass
+        evicted.append((key,))
+        total -= size
+        if total <= max_bytes:
+            break
+    conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+    conn.execute("UPDATE cache_size SET total = ?", (total,))
+    logger.info(f"Evicted {len(evicted)} document cache entries")
+
+def evict(cache_dir=DOC_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """Delete least recently used entries until the cache fits in max_bytes"""
+    conn = _open_index(cache_dir)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _evict_over(conn, cache_dir, max_bytes)
+    finally:
+        conn.close()
@@ -0,0 +1,157 @@
+# data_processing/extraction_regression.py
+# Regression corpus for the key-details extraction engine and a speed report against the original
+# (the engine's outputs are checked against the original in tests/test_extraction.py)
+#
+# Usage: python -m data_processing.extraction_regression [directory of .txt documents]
+
+import random
+import time
+import sys
+import os
+import re
+
+from data_processing.processor import extract_key_details
+
+def legacy_extract_key_details(text):
+    """
+    Reference implementation: the original four independent regex searches
+    """
+    details = {}
+    
+    # Extract EMD amount (simplified regex patterns, would need refinement for real data)
+    emd_pattern = r"EMD.*?(?:Rs\.|₹|INR)\s*([\d,]+(?:\.\d+)?)"
+    emd_match = re.search(emd_pattern, text, re.IGNORECASE)
+    if emd_match:
+        details["extracted_emd"] = emd_match.group(1)
+    
+    # Extract deadline
+    deadline_pattern = r"(?:submission|closing|due)\s*date.*?(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})"
+    deadline_match = re.search(deadline_pattern, text, re.IGNORECASE)
+    if deadline_match:
+        details["extracted_deadline"] = deadline_match.group(1)
+    
+    # Extract scope of work
+    scope_pattern = r"(?:scope\s+of\s+work|statement\s+of\s+work).*?((?:\w+\W+){50})"
+    scope_match = re.search(scope_pattern, text, re.IGNORECASE)
+    if scope_match:
+        details["extracted_scope"] = scope_match.group(1).strip()
+    
+    # Extract eligibility criteria
+    eligibility_pattern = r"(?:eligibility|qualification)\s+criteria.*?((?:\w+\W+){50})"
+    eligibility_match = re.search(eligibility_pattern, text, re.IGNORECASE)
+    if eligibility_match:
+        details["extracted_eligibility"] = eligibility_match.group(1).strip()
+    
+    return details
+
+FILLER_WORDS = [
+    "tender", "supply", "installation", "commissioning", "government", "department", "works",
+    "contractor", "bidder", "shall", "provide", "services", "maintenance", "network", "equipment",
+    "annual", "contract", "schedule", "technical", "financial", "documents", "certificate"
+]
+
+# Hand-written edge cases: values on later lines, repeated anchors, short sections,
+# anchors at line ends, mixed case and every currency/date notation
+EDGE_CASES = [
+    "EMD: Rs. 1,50,000\nBid submission date: 15/05/2025",
+    "EMD details are given below\nEMD amount INR 25,000.50",
+    "emd ₹ 300000 payable by DD. Closing Date 5 May 2025 at 3 PM",
+    "Due date\n15-06-2025\nDue date of submission 20-06-25",
+    "submissiondate 1/1/2025 EMD Rs.\n5000",
+    "Scope of Work\nThe contractor shall supply the equipment.",
+    "Statement of work: " + " ".join(["item"] * 49) + ".",
+    "Statement of work: " + " ".join(["item"] * 49),
+    "Eligibility Criteria - " + " ".join(f"w{i}" for i in range(60)) + "...\n\nEnd",
+    "Qualification   criteria:\n" + " ".join(f"w{i}" for i in range(60)) + ".",
+    "Qualification criteria: a b\nEligibility criteria: " + " ".join(f"x{i}" for i in range(55)) + " ",
+    "Scope of workers: " + " ".join(f"s{i}" for i in range(51)) + " ",
+    "No fields in this document at all.",
+    "Tender ref 12/emdue date 3/4/2025 and residue date 9/9/2025",
+    "\u017fcope of work: " + " ".join(f"u{i}" for i in range(50)) + ". EMD \u20b9 99",
+    "\u0130nstruction: Submission Date 1 Jan 2026; EMD Rs. 10",
+    "",
+]
+
+def _filler(rng, n_words):
+    return " ".join(rng.choice(FILLER_WORDS) for _ in range(n_words))
+
+def build_regression_corpus(n_documents=200, seed=7):
+    """
+    Deterministic synthetic tender documents with fields in random order and
+    notation, plus the edge cases. Some documents carry section headings with
+    too few words after them, the case where the original patterns backtrack.
+    """
+    rng = random.Random(seed)
+    months = ["Jan", "February", "Mar", "April", "May", "Jun", "July", "Aug", "Sept", "Oct", "Nov", "December"]
+    documents = list(EDGE_CASES)
+    
+    for _ in range(n_documents):
+        sections = [_filler(rng, rng.randint(50, 400)) for _ in range(rng.randint(3, 12))]
+        if rng.random() < 0.8:
+            currency = rng.choice(["Rs.", "₹", "INR", "Rs. "])
+            sections.append(f"EMD {rng.choice(['amount', 'of', ':'])} {currency}{rng.randint(1, 999)},{rng.randint(100, 999)}")
+        if rng.random() < 0.8:
+            date = rng.choice([
+                f"{rng.randint(1, 28)}/{rng.randint(1, 12)}/{rng.choice([2025, 25])}",
+                f"{rng.randint(1, 28)}-{rng.randint(1, 12)}-2025",
+                f"{rng.randint(1, 28)} {rng.choice(months)} 2025"
+            ])
+            sections.append(f"{rng.choice(['Submission', 'Closing', 'Due'])} date{rng.choice([':', ' is', ''])} {date}")
+        for heading in ("Scope of Work", "Eligibility criteria"):
+            if rng.random() < 0.7:
+                sections.append(f"{heading}: {_filler(rng, rng.randint(10, 120))}.")
+        if rng.random() < 0.2:
+            # A heading near the end with fewer than 50 words after it
+            sections.append(f"Statement of work {_filler(rng, rng.randint(1, 30))}")
+        rng.shuffle(sections)
+        documents.append("\n".join(sections))
+    return documents
+
+def load_documents(directory):
+    """Read every .txt document in a directory"""
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".txt"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                documents.append(f.read())
+    return documents
+
+def find_mismatches(documents):
+    """
+    Compare the engine with the original implementation on every document.
+    Returns a list of (index, legacy_output, engine_output) for the documents they disagree on.
+    """
+    mismatches = []
+    for i, text in enumerate(documents):
+        expected, actual = legacy_extract_key_details(text), extract_key_details(text)
+        if expected != actual:
+            mismatches.append((i, expected, actual))
+    return mismatches
+
+def time_extraction(documents):
+    """Return (legacy_seconds, engine_seconds) spent extracting every document"""
+    start = time.perf_counter()
+    for text in documents:
+        legacy_extract_key_details(text)
+    legacy_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for text in documents:
+        extract_key_details(text)
+    engine_seconds = time.perf_counter() - start
+    return legacy_seconds, engine_seconds
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    documents = build_regression_corpus()
+    if argv:
+        documents.extend(load_documents(argv[0]))
+    
+    legacy_seconds, engine_seconds = time_extraction(documents)
+    print(f"Documents: {len(documents)}")
+    print(f"Original: {legacy_seconds:.3f}s  Engine: {engine_seconds:.3f}s  "
+          f"Speedup: {legacy_seconds / engine_seconds if engine_seconds else float('inf'):.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+# data_processing/normalizer.py
+# Normalization of raw tender fields into typed, compact columns
+
+import pandas as pd
+import numpy as np
+
+# Columns turned into categoricals; few distinct values repeated across many tenders
+CATEGORICAL_COLUMNS = ["source", "organization"]
+
+def parse_deadlines(deadlines):
+    """Parse deadline strings into a datetime64 series (NaT when unparseable)"""
+    deadlines = pd.Series(deadlines, dtype=object)
+    # ISO dates first, then the day-first formats (15/05/2025, 15 May 2025) portals use
+    parsed = pd.to_datetime(deadlines, errors="coerce", format="ISO8601")
+    parsed = parsed.fillna(pd.to_datetime(deadlines, errors="coerce", format="mixed", dayfirst=True))
+    return parsed.astype("datetime64[ns]")
+
+def parse_emd_paise(amounts):
+    """
+    Parse EMD strings like "₹150,000" or "Rs. 1,50,000.50" into an Int64 series
+    of paise (<NA> when missing or unparseable)
+    """
+    amounts = pd.Series(amounts, dtype=object).astype("string")
+    # Keep the first number, dropping currency symbols and digit-group commas
+    numbers = amounts.str.replace(",", "", regex=False).str.extract(r"(\d+(?:\.\d+)?)", expand=False)
+    rupees = pd.to_numeric(numbers, errors="coerce")
+    return (rupees * 100).round().astype("Int64")
+
+def apply_tender_dtypes(tenders_df):
+    """
+    Convert whichever typed columns are present to their compact dtypes:
+    deadline_date to datetime64, emd_paise to Int64, source/organization to categoricals
+    """
+    if "deadline_date" in tenders_df:
+        tenders_df["deadline_date"] = pd.to_datetime(tenders_df["deadline_date"], errors="coerce").astype("datetime64[ns]")
+    if "emd_paise" in tenders_df:
+        tenders_df["emd_paise"] = pd.to_numeric(tenders_df["emd_paise"], errors="coerce").astype("Int64")
+    for column in CATEGORICAL_COLUMNS:
+        if column in tenders_df:
+            tenders_df[column] = tenders_df[column].astype("category")
+    return tenders_df
+
+def emd_rupees(tenders_df):
+    """EMD amounts in rupees as a float array, NaN when unknown"""
+    if "emd_paise" in tenders_df:
+        paise = tenders_df["emd_paise"]
+    else:
+        paise = parse_emd_paise(tenders_df["emd_amount"])
+    return paise.astype("Float64").to_numpy(dtype=float, na_value=np.nan) / 100
@@ -2,69 +2,343 @@
 # Data processing functions for tender documents
 
 import pdfplumber
+import multiprocessing
+from multiprocessing.connection import wait
+from concurrent.futures import ProcessPoolExecutor
+import time
+import os
 import re
 import logging
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from data_processing import doc_cache
+from monitoring import metrics
+
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text content from a PDF file"""
+# Constants
+EXTRACTOR_VERSION = 1        # bump when extraction output changes to invalidate cached results
+EARLY_STOP_OVERLAP = 4000    # chars of the previous pages re-checked with each new page
+DOC_TIMEOUT = 120            # seconds allowed per document in bulk processing
+DOC_MEMORY_LIMIT_MB = 1024   # address-space cap per document worker
+
+def iter_pdf_pages(pdf_path):
+    """Yield the text of each page of a PDF file, one page at a time"""
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
+            # Drop the parsed page objects as we go
+            page.close()
+
+def _read_pdf(pdf_path, stop_early=False):
+    """
+    Read pages of a PDF and join them once. With stop_early, reading stops as
+    soon as every key field has been found. Returns (text, pages_read).
+    """
+    pages = []
+    found = set()
+    tail = ""
+    for page_text in iter_pdf_pages(pdf_path):
+        pages.append(page_text)
+        if stop_early:
+            # Fields can straddle a page break, so re-check the end of the previous pages
+            window = tail + page_text
+            found.update(extract_key_details(window))
+            if found.issuperset(EXTRACTION_RULES):
+                break
+            tail = window[-EARLY_STOP_OVERLAP:]
+    return "".join(pages), len(pages)
+
+def extract_text_from_pdf(pdf_path, stop_early=False):
+    """
+    Extract text content from a PDF file
+    With stop_early, pages after the one completing all key fields are skipped.
+    """
     try:
-        text = ""
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
+        text, _ = _read_pdf(pdf_path, stop_early)
         return text
     except Exception as e:
         logger.error(f"Error extracting text from PDF {pdf_path}: {str(e)}")
         return ""
 
+# Extraction rules: an anchor locating each field, the lowercase keywords an anchor
+# starts with, and how its value is read after it. Values must start on the anchor's line.
+EXTRACTION_RULES = {
+    # Simplified patterns, would need refinement for real data
+    "extracted_emd": {
+        "keywords": ["emd"],
+        "anchor": r"EMD",
+        "value": r"(?:Rs\.|₹|INR)\s*([\d,]+(?:\.\d+)?)"
+    },
+    "extracted_deadline": {
+        "keywords": ["submission", "closing", "due"],
+        "anchor": r"(?:submission|closing|due)\s*date",
+        "value": r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})"
+    },
+    "extracted_scope": {
+        "keywords": ["scope", "statement"],
+        "anchor": r"(?:scope\s+of\s+work|statement\s+of\s+work)",
+        "words": 50
+    },
+    "extracted_eligibility": {
+        "keywords": ["eligibility", "qualification"],
+        "anchor": r"(?:eligibility|qualification)\s+criteria",
+        "words": 50
+    }
+}
+VALUE_WINDOW = 256  # chars a value may run past the end of its anchor's line
+
+# Keyword prefilter: one scan of the lowercased text for every anchor's leading word,
+# then the full anchor is confirmed only at the hits
+_KEYWORD_FIELDS = {keyword: field for field, rule in EXTRACTION_RULES.items() for keyword in rule["keywords"]}
+_KEYWORD_RE = re.compile("|".join(map(re.escape, _KEYWORD_FIELDS)))
+_FIELD_ANCHOR_RES = {field: re.compile(rule["anchor"], re.IGNORECASE) for field, rule in EXTRACTION_RULES.items()}
+# Fallback for text where lowercasing shifts offsets or hides a case-insensitive match
+_ANCHOR_RE = re.compile(
+    "|".join(f"(?P<{field}>{rule['anchor']})" for field, rule in EXTRACTION_RULES.items()),
+    re.IGNORECASE
+)
+_VALUE_RES = {
+    field: re.compile(rule["value"], re.IGNORECASE)
+    for field, rule in EXTRACTION_RULES.items() if "value" in rule
+}
+_LINE_GAP_RE = re.compile(r"[^\w\n]*")
+_WORD_RUN_RE = re.compile(r"\w+\W+")
+
+def _iter_anchors(text):
+    """Yield (field, anchor end) for every field anchor, in text order"""
+    lowered = text.lower()
+    # Dotless i and long s match i/s case-insensitively but lowercase to themselves
+    if len(lowered) != len(text) or "\u0131" in text or "\u017f" in text:
+        for anchor in _ANCHOR_RE.finditer(text):
+            yield anchor.lastgroup, anchor.end()
+        return
+    
+    hit = _KEYWORD_RE.search(lowered)
+    while hit:
+        field = _KEYWORD_FIELDS[hit.group()]
+        anchor = _FIELD_ANCHOR_RES[field].match(text, hit.start())
+        if anchor:
+            yield field, anchor.end()
+        # Keywords can overlap ("emdue date"), so resume right after the hit's start
+        hit = _KEYWORD_RE.search(lowered, hit.start() + 1)
+
+def _extract_value(field, text, start, line_end):
+    """Value of a pattern field starting on the anchor's line, or None"""
+    match = _VALUE_RES[field].search(text, start, min(len(text), line_end + VALUE_WINDOW))
+    if match and match.start() < line_end:
+        return match.group(1)
+    return None
+
+def _extract_words(text, start, n_words):
+    """The n_words words following an anchor, starting on the anchor's line, or None"""
+    start = _LINE_GAP_RE.match(text, start).end()
+    if start >= len(text) or text[start] == "\n":
+        return None
+    
+    end = None
+    for count, match in enumerate(_WORD_RUN_RE.finditer(text, start), 1):
+        if count == n_words:
+            end = match.end()
+            break
+    return text[start:end].strip() if end is not None else None
+
 def extract_key_details(text):
     """
     Extract key tender details from text like EMD amount, deadlines, etc.
     Returns a dictionary of extracted information
+    
+    All field anchors are found in a single keyword scan of the text; each
+    field takes the first anchor whose value can be read, and the scan ends
+    once every field is found. Values are only searched in a bounded window
+    after their anchor, so nothing rescans the rest of the document.
     """
     details = {}
     
-    # Extract EMD amount (simplified regex patterns, would need refinement for real data)
-    emd_pattern = r"EMD.*?(?:Rs\.|₹|INR)\s*([\d,]+(?:\.\d+)?)"
-    emd_match = re.search(emd_pattern, text, re.IGNORECASE)
-    if emd_match:
-        details["extracted_emd"] = emd_match.group(1)
+    for field, anchor_end in _iter_anchors(text):
+        if field in details:
+            continue
+        
+        line_end = text.find("\n", anchor_end)
+        if line_end == -1:
+            line_end = len(text)
+        
+        rule = EXTRACTION_RULES[field]
+        if "words" in rule:
+            value = _extract_words(text, anchor_end, rule["words"])
+        else:
+            value = _extract_value(field, text, anchor_end, line_end)
+        
+        if value is not None:
+            details[field] = value
+            if len(details) == len(EXTRACTION_RULES):
+                break
     
-    # Extract deadline
-    deadline_pattern = r"(?:submission|closing|due)\s*date.*?(\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4})"
-    deadline_match = re.search(deadline_pattern, text, re.IGNORECASE)
-    if deadline_match:
-        details["extracted_deadline"] = deadline_match.group(1)
+    # Keep the original field order
+    return {field: details[field] for field in EXTRACTION_RULES if field in details}
+
+def extract_key_details_batch(texts, n_jobs=1, chunksize=64):
+    """Extract key details from many texts, optionally across a process pool"""
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(executor.map(extract_key_details, texts, chunksize=chunksize))
+    return [extract_key_details(text) for text in texts]
+
+def _cache_namespace(stop_early):
+    return f"extractor-v{EXTRACTOR_VERSION}-stop_early-{int(bool(stop_early))}"
+
+def process_tender_document(document_path, stop_early=False, use_cache=True):
+    """
+    Process a tender document to extract all relevant information
+    Results are cached by file content, so an unchanged document is only parsed once.
+    """
+    key = doc_cache.cache_key(document_path, _cache_namespace(stop_early)) if use_cache else None
+    if key is not None:
+        cached = doc_cache.get_cached(key)
+        if cached is not None:
+            metrics.increment("documents_parsed", status="cached")
+            return cached
     
-    # Extract scope of work
-    scope_pattern = r"(?:scope\s+of\s+work|statement\s+of\s+work).*?((?:\w+\W+){50})"
-    scope_match = re.search(scope_pattern, text, re.IGNORECASE)
-    if scope_match:
-        details["extracted_scope"] = scope_match.group(1).strip()
+    with metrics.timed("extract"):
+        if document_path.endswith('.pdf'):
+            text = extract_text_from_pdf(document_path, stop_early)
+        else:
+            # For text files
+            with open(document_path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        
+        # Extract details
+        details = extract_key_details(text)
+        details['full_text'] = text
+    metrics.increment("documents_parsed", status="ok" if text else "error")
     
-    # Extract eligibility criteria
-    eligibility_pattern = r"(?:eligibility|qualification)\s+criteria.*?((?:\w+\W+){50})"
-    eligibility_match = re.search(eligibility_pattern, text, re.IGNORECASE)
-    if eligibility_match:
-        details["extracted_eligibility"] = eligibility_match.group(1).strip()
+    # Failed PDF reads return no text; don't cache those
+    if key is not None and text:
+        doc_cache.put_cached(key, details)
     
     return details
 
-def process_tender_document(document_path):
+def _address_space_bytes():
+    """Current virtual memory size of this process (Linux), 0 when unknown"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _process_document_worker(document_path, stop_early, memory_limit_mb, conn):
+    """Worker process body: extract one document and send back its report"""
+    if resource is not None and memory_limit_mb:
+        # Cap what the document may add on top of the interpreter inherited from the parent
+        limit = _address_space_bytes() + memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    
+    start = time.perf_counter()
+    try:
+        if document_path.endswith('.pdf'):
+            text, pages = _read_pdf(document_path, stop_early)
+        else:
+            with open(document_path, 'r', encoding='utf-8') as f:
+                text, pages = f.read(), 1
+        details = extract_key_details(text)
+        details['full_text'] = text
+        conn.send({"status": "ok", "pages": pages, "seconds": time.perf_counter() - start, "details": details})
+    except MemoryError:
+        conn.send({"status": "memory_limit", "seconds": time.perf_counter() - start,
+                   "error": f"exceeded {memory_limit_mb} MB"})
+    except Exception as e:
+        conn.send({"status": "error", "seconds": time.perf_counter() - start, "error": str(e)})
+    finally:
+        conn.close()
+
+def process_documents(document_paths, max_workers=None, timeout=DOC_TIMEOUT,
+                      memory_limit_mb=DOC_MEMORY_LIMIT_MB, stop_early=True, use_cache=True):
     """
-    Process a tender document to extract all relevant information
+    Process many tender documents in parallel, one worker process per document
+    (at most max_workers at a time), each with a timeout and a memory cap.
+    Returns one report per file, in input order, with status ("ok", "cached",
+    "error", "timeout", "memory_limit" or "crashed"), seconds, pages,
+    pages_per_second and the extracted details when successful.
     """
-    if document_path.endswith('.pdf'):
-        text = extract_text_from_pdf(document_path)
-    else:
-        # For text files
-        with open(document_path, 'r', encoding='utf-8') as f:
-            text = f.read()
+    document_paths = list(document_paths)
+    max_workers = max_workers or os.cpu_count() or 1
+    reports = [None] * len(document_paths)
+    keys = [None] * len(document_paths)
+    pending = []
+    running = {}  # receiving connection -> (index, process, started)
+    start = time.perf_counter()
+    
+    # Documents seen before are served from the cache without a worker
+    for index, document_path in enumerate(document_paths):
+        if use_cache:
+            try:
+                keys[index] = doc_cache.cache_key(document_path, _cache_namespace(stop_early))
+            except OSError:
+                pass
+            cached = doc_cache.get_cached(keys[index]) if keys[index] else None
+            if cached is not None:
+                reports[index] = {"status": "cached", "path": document_path, "seconds": 0.0,
+                                  "pages": 0, "pages_per_second": 0.0, "details": cached}
+                metrics.increment("documents_parsed", status="cached")
+                continue
+        pending.append((index, document_path))
+    pending.reverse()
     
-    # Extract details
-    details = extract_key_details(text)
-    details['full_text'] = text
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index, document_path = pending.pop()
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_process_document_worker,
+                args=(document_path, stop_early, memory_limit_mb, sender),
+                daemon=True
+            )
+            process.start()
+            sender.close()
+            running[receiver] = (index, process, time.perf_counter())
+        
+        ready = wait(list(running), timeout=0.1)
+        now = time.perf_counter()
+        for receiver in list(running):
+            index, process, started = running[receiver]
+            report = None
+            if receiver in ready:
+                try:
+                    report = receiver.recv()
+                except EOFError:
+                    report = {"status": "crashed", "seconds": now - started,
+                              "error": f"worker exited with code {process.exitcode}"}
+            elif now - started > timeout:
+                process.terminate()
+                report = {"status": "timeout", "seconds": now - started, "error": f"exceeded {timeout}s"}
+            if report is None:
+                continue
+            
+            process.join()
+            receiver.close()
+            del running[receiver]
+            
+            report["path"] = document_paths[index]
+            report.setdefault("pages", 0)
+            report["pages_per_second"] = report["pages"] / report["seconds"] if report["seconds"] else 0.0
+            # Workers time themselves; their metrics are recorded here in the parent
+            metrics.observe("stage_seconds", report["seconds"], stage="extract")
+            metrics.increment("documents_parsed", status=report["status"])
+            if report["status"] != "ok":
+                logger.error(f"Failed to process {report['path']}: {report['status']} ({report.get('error')})")
+            elif keys[index] is not None and report["details"]["full_text"]:
+                doc_cache.put_cached(keys[index], report["details"])
+            reports[index] = report
     
-    return details
\ No newline at end of file
+    elapsed = time.perf_counter() - start
+    succeeded = sum(report["status"] in ("ok", "cached") for report in reports)
+    pages = sum(report["pages"] for report in reports)
+    logger.info(
+        f"Processed {len(reports)} documents in {elapsed:.1f}s: {succeeded} ok, "
+        f"{len(reports) - succeeded} failed, {pages / elapsed if elapsed else 0:.1f} pages/s"
+    )
+    return reports
@@ -0,0 +1,257 @@
+# monitoring/metrics.py
+# In-process counters, stage latency histograms, Prometheus export and an optional sampling profiler
+
+from contextlib import contextmanager
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = "data"
+METRICS_DIR = os.path.join(DATA_DIR, "metrics")
+PROFILER_DIR = os.path.join(DATA_DIR, "profiler")  # kept apart from the uploaded company profiles in data/profiles
+METRIC_PREFIX = "tender_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+PROFILE_INTERVAL = 0.005  # seconds between stack samples
+# Stages to profile while they run, e.g. TENDER_PROFILE_STAGES=extract,vectorize (or "all")
+PROFILE_STAGES = {stage.strip() for stage in os.environ.get("TENDER_PROFILE_STAGES", "").split(",") if stage.strip()}
+
+METRIC_HELP = {
+    "stage_seconds": "Time spent in a pipeline stage",
+    "pages_fetched": "Portal pages fetched, by host and HTTP status",
+    "tenders_upserted": "Tender records written to the store, by outcome",
+    "documents_parsed": "Tender documents processed, by status",
+    "vectors_built": "Tender rows vectorized, by vectorizer kind",
+    "emails_sent": "Email digests delivered or given up on, by status",
+    "email_retries": "Email send attempts that will be retried",
+}
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> {"buckets": [...], "count", "sum", "max"}
+_started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def increment(name, value=1, **labels):
+    """Add value to a counter"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    """Record one observation (seconds for latencies) in a histogram"""
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "count": 0, "sum": 0.0, "max": 0.0}
+        histogram["buckets"][bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block (or, as a decorator, a function) as a pipeline stage in the
+    stage_seconds histogram. Stages listed in TENDER_PROFILE_STAGES are also sampled by a SamplingProfiler.
+    """
+    profiler = None
+    if stage in PROFILE_STAGES or "all" in PROFILE_STAGES:
+        profiler = SamplingProfiler().start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=stage)
+        if profiler is not None:
+            profiler.stop()
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+            profiler.write(os.path.join(PROFILER_DIR, f"{stage}-{stamp}.folded"))
+
+def _quantile(buckets, count, maximum, q):
+    """Estimate a quantile from bucket counts by linear interpolation"""
+    rank = q * count
+    seen = 0
+    for i, bucket_count in enumerate(buckets):
+        if bucket_count and seen + bucket_count >= rank:
+            low = LATENCY_BUCKETS[i - 1] if i else 0.0
+            high = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else maximum
+            return min(maximum, low + (high - low) * (rank - seen) / bucket_count)
+        seen += bucket_count
+    return maximum
+
+def snapshot():
+    """Current counters and histograms (with mean, p50, p95 and max) as plain data"""
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        histograms = []
+        for (name, labels), histogram in sorted(_histograms.items()):
+            count = histogram["count"]
+            histograms.append({
+                "name": name,
+                "labels": dict(labels),
+                "count": count,
+                "sum": histogram["sum"],
+                "mean": histogram["sum"] / count if count else 0.0,
+                "p50": _quantile(histogram["buckets"], count, histogram["max"], 0.5),
+                "p95": _quantile(histogram["buckets"], count, histogram["max"], 0.95),
+                "max": histogram["max"],
+                "buckets": list(histogram["buckets"]),
+            })
+    return {
+        "pid": os.getpid(),
+        "started_at": _started_at,
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "counters": counters,
+        "histograms": histograms,
+    }
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in items)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + "}"
+
+def render_prometheus(snap=None):
+    """Render a snapshot (the current one by default) in the Prometheus text exposition format"""
+    snap = snap or snapshot()
+    lines = []
+    described = set()
+    
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            base = name[len(METRIC_PREFIX):].removesuffix("_total")
+            lines.append(f"# HELP {name} {METRIC_HELP.get(base, base)}")
+            lines.append(f"# TYPE {name} {kind}")
+    
+    for counter in snap["counters"]:
+        name = f"{METRIC_PREFIX}{counter['name']}_total"
+        describe(name, "counter")
+        lines.append(f"{name}{_format_labels(counter['labels'])} {counter['value']}")
+    
+    for histogram in snap["histograms"]:
+        name = f"{METRIC_PREFIX}{histogram['name']}"
+        describe(name, "histogram")
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(histogram['labels'], {'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{name}_count{_format_labels(histogram['labels'])} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    # Unique per writer, as app sessions export from several threads
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, path)
+
+def export_metrics(process_name, metrics_dir=METRICS_DIR):
+    """
+    Write this process's metrics to <process_name>.prom (for the Prometheus
+    node exporter's textfile collector) and <process_name>.json (read by the
+    app's diagnostics panel)
+    """
+    snap = snapshot()
+    os.makedirs(metrics_dir, exist_ok=True)
+    _write_atomic(os.path.join(metrics_dir, f"{process_name}.prom"), render_prometheus(snap))
+    _write_atomic(os.path.join(metrics_dir, f"{process_name}.json"), json.dumps(snap))
+    return snap
+
+def load_exported_metrics(metrics_dir=METRICS_DIR):
+    """Snapshots exported by each process, keyed by process name"""
+    exported = {}
+    if not os.path.isdir(metrics_dir):
+        return exported
+    for name in sorted(os.listdir(metrics_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name), "r", encoding="utf-8") as f:
+                exported[name[:-len(".json")]] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return exported
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+def serve_metrics(port, host=""):
+    """Serve this process's metrics at http://<host>:<port>/metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on port {server.server_address[1]}")
+    return server
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every interval seconds from a background
+    thread. Samples are written in the collapsed-stack format read by
+    flamegraph.pl and speedscope.
+    """
+    
+    def __init__(self, thread_id=None, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+    
+    def start(self):
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        return self
+    
+    def write(self, path):
+        """Write the samples as collapsed stacks, one "stack count" line each"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Wrote {sum(self.samples.values())} profile samples to {path}")
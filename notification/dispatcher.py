@@ -0,0 +1,285 @@
+# notification/dispatcher.py
+# Background email dispatcher: one digest per recipient over pooled SMTP connections
+
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from datetime import datetime, timezone
+import threading
+import queue
+import json
+import time
+import uuid
+import logging
+
+import pandas as pd
+
+from notification.notifier import SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, APP_PASSWORD
+from monitoring import metrics
+from storage import tender_store
+
+logger = logging.getLogger(__name__)
+
+# Constants
+SEND_WORKERS = 1          # sender threads, each keeping one SMTP connection open
+MAX_SENDS_PER_MINUTE = 20  # shared across workers; keeps under provider rate limits
+MAX_SEND_ATTEMPTS = 4
+RETRY_BACKOFF = 2.0       # seconds before the first retry, doubled after each failure
+SMTP_TIMEOUT = 30
+SMTP_IDLE_TIMEOUT = 120   # close a connection unused this long; servers drop idle ones anyway
+DIGEST_COLUMNS = ["tender_id", "title", "organization", "deadline", "emd_amount", "match_score", "url"]
+
+DELIVERY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification_deliveries (
+    delivery_id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    tender_ids TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_recipient ON notification_deliveries(recipient, created_at);
+"""
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def _get_connection(db_path):
+    conn = tender_store.get_connection(db_path)
+    conn.executescript(DELIVERY_SCHEMA)
+    return conn
+
+def get_deliveries(recipient=None, limit=50, db_path=tender_store.TENDERS_DB):
+    """Return recent deliveries (newest first) with their status, optionally for one recipient"""
+    sql = "SELECT * FROM notification_deliveries"
+    params = []
+    if recipient is not None:
+        sql += " WHERE recipient = ?"
+        params.append(recipient)
+    sql += " ORDER BY created_at DESC, rowid DESC LIMIT ?"
+    params.append(int(limit))
+    
+    conn = _get_connection(db_path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+def build_digest(recipient, tenders_df, sender_email=SENDER_EMAIL):
+    """Build one email listing every matched tender for a recipient"""
+    msg = MIMEMultipart()
+    msg["From"] = sender_email
+    msg["To"] = recipient
+    msg["Subject"] = f"{len(tenders_df)} New Tender Match{'es' if len(tenders_df) != 1 else ''}"
+    
+    entries = []
+    for tender in tenders_df.to_dict("records"):
+        entries.append(
+            f"Tender ID: {tender.get('tender_id')}\n"
+            f"Title: {tender.get('title')}\n"
+            f"Organization: {tender.get('organization')}\n"
+            f"Deadline: {tender.get('deadline')}\n"
+            f"EMD Amount: {tender.get('emd_amount')}\n"
+            f"Match Score: {tender.get('match_score', 0):.2f}\n"
+            f"View more details at: {tender.get('url')}"
+        )
+    body = (
+        "Dear User,\n\n"
+        f"We found {len(entries)} tenders that match your company profile:\n\n"
+        + "\n\n".join(entries)
+        + "\n\nBest regards,\nGovernment Tender Tracker\n"
+    )
+    msg.attach(MIMEText(body, "plain"))
+    return msg
+
+def _is_permanent(error):
+    """5xx replies (bad recipient, rejected content, failed login) won't succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+class RateLimiter:
+    """Spaces calls evenly so at most per_minute happen in any minute, across threads"""
+    
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+    
+    def wait(self, stop_event=None):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        delay = start - now
+        if delay > 0:
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+class NotificationDispatcher:
+    """
+    Queue digests for delivery by background sender threads.
+    
+    Each sender keeps its SMTP connection (STARTTLS and login done once) open
+    between messages and reconnects when it drops. Sends are rate limited, and
+    transient failures are retried with exponential backoff. The status of every
+    delivery (queued, sent, retrying, failed) is recorded in the tender store
+    database. Pass use_tls=False and no password to send through a local SMTP
+    stub such as `python -m aiosmtpd -n -l localhost:8025`.
+    """
+    
+    def __init__(self, smtp_server=SMTP_SERVER, smtp_port=SMTP_PORT, sender_email=SENDER_EMAIL,
+                 password=APP_PASSWORD, use_tls=True, workers=SEND_WORKERS,
+                 max_per_minute=MAX_SENDS_PER_MINUTE, max_attempts=MAX_SEND_ATTEMPTS,
+                 retry_backoff=RETRY_BACKOFF, db_path=tender_store.TENDERS_DB):
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.sender_email = sender_email
+        self.password = password
+        self.use_tls = use_tls
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.db_path = db_path
+        self.rate_limiter = RateLimiter(max_per_minute)
+        self.jobs = queue.Queue()
+        self.stop_event = threading.Event()
+        self.threads = [
+            threading.Thread(target=self._run, name=f"notification-sender-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+    
+    def submit_digest(self, recipient, tenders_df, on_sent=None):
+        """
+        Queue one digest email listing the given tenders for a recipient.
+        on_sent, if given, is called without arguments once the digest is sent.
+        Returns the delivery id, or None when there is nothing to send.
+        """
+        if tenders_df.empty:
+            return None
+        tenders_df = tenders_df[[column for column in DIGEST_COLUMNS if column in tenders_df]]
+        delivery_id = uuid.uuid4().hex
+        tender_ids = json.dumps([str(tender_id) for tender_id in tenders_df["tender_id"]])
+        
+        conn = _get_connection(self.db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO notification_deliveries "
+                    "(delivery_id, recipient, tender_ids, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                    (delivery_id, recipient, tender_ids, _now(), _now())
+                )
+        finally:
+            conn.close()
+        
+        self.jobs.put((delivery_id, recipient, tenders_df.copy(), on_sent))
+        return delivery_id
+    
+    def join(self):
+        """Block until every queued digest is sent or has failed"""
+        self.jobs.join()
+    
+    def close(self, wait=True):
+        """Stop the sender threads, after draining the queue when wait is True"""
+        if wait:
+            self.join()
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+    
+    def _record(self, delivery_id, status, attempts, error=None):
+        conn = _get_connection(self.db_path)
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE notification_deliveries SET status = ?, attempts = ?, error = ?, updated_at = ? "
+                    "WHERE delivery_id = ?",
+                    (status, attempts, error, _now(), delivery_id)
+                )
+        finally:
+            conn.close()
+    
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT)
+        if self.use_tls:
+            server.starttls()
+        if self.password:
+            server.login(self.sender_email, self.password)
+        return server
+    
+    @staticmethod
+    def _disconnect(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+    
+    def _run(self):
+        server = None
+        last_used = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                job = self.jobs.get(timeout=1.0)
+            except queue.Empty:
+                if server is not None and time.monotonic() - last_used > SMTP_IDLE_TIMEOUT:
+                    self._disconnect(server)
+                    server = None
+                continue
+            
+            try:
+                server = self._deliver(server, *job)
+            except Exception as e:
+                logger.error(f"Email digest {job[0]} could not be delivered: {str(e)}")
+                self._record(job[0], "failed", 0, str(e))
+                metrics.increment("emails_sent", status="failed")
+            finally:
+                last_used = time.monotonic()
+                self.jobs.task_done()
+        
+        if server is not None:
+            self._disconnect(server)
+    
+    def _deliver(self, server, delivery_id, recipient, tenders_df, on_sent):
+        """Send one digest with retries; returns the connection to keep using"""
+        msg = build_digest(recipient, tenders_df, self.sender_email)
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if server is None:
+                    server = self._connect()
+                self.rate_limiter.wait(self.stop_event)
+                with metrics.timed("notify"):
+                    server.send_message(msg)
+            except (smtplib.SMTPException, OSError) as e:
+                error = str(e)
+                # After an SMTP reply the connection is still usable, except after 421
+                # (smtplib closes it); otherwise reconnect
+                replied = isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused))
+                if server is not None and (not replied or getattr(e, "smtp_code", None) == 421):
+                    server.close()
+                    server = None
+                if _is_permanent(e) or attempt == self.max_attempts:
+                    self._record(delivery_id, "failed", attempt, error)
+                    logger.error(f"Failed to send email digest to {recipient}: {error}")
+                    metrics.increment("emails_sent", status="failed")
+                    return server
+                
+                self._record(delivery_id, "retrying", attempt, error)
+                metrics.increment("email_retries")
+                self.stop_event.wait(self.retry_backoff * 2 ** (attempt - 1))
+                continue
+            
+            self._record(delivery_id, "sent", attempt)
+            metrics.increment("emails_sent", status="sent")
+            logger.info(f"Email digest of {len(tenders_df)} tenders sent to {recipient}")
+            if on_sent is not None:
+                try:
+                    on_sent()
+                except Exception as e:
+                    logger.error(f"Post-delivery callback for {delivery_id} failed: {str(e)}")
+            return server
+        return server
@@ -0,0 +1,195 @@
+# notification/ledger.py
+# Ledger of notified tenders and nightly alert runs that only send new matches
+
+import hashlib
+import re
+from datetime import datetime, timezone
+import logging
+
+import pandas as pd
+
+from recommendation.matcher import MAX_MATCH_RESULTS, batch_match_profiles
+from storage import tender_store
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_ALERT_THRESHOLD = 0.3
+
+LEDGER_SCHEMA = """
+-- One row per tender version notified to a recipient for a profile
+CREATE TABLE IF NOT EXISTS notification_ledger (
+    recipient TEXT NOT NULL,
+    profile_key TEXT NOT NULL,
+    tender_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    notified_at TEXT,
+    PRIMARY KEY (recipient, profile_key, tender_id, content_hash)
+) WITHOUT ROWID;
+
+-- Profiles that get nightly alerts; last_seen is the updated_at watermark of the last run
+CREATE TABLE IF NOT EXISTS alert_subscriptions (
+    recipient TEXT NOT NULL,
+    profile_key TEXT NOT NULL,
+    profile_text TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    last_seen TEXT,
+    PRIMARY KEY (recipient, profile_key)
+);
+"""
+
+def _get_connection(db_path):
+    conn = tender_store.get_connection(db_path)
+    conn.executescript(LEDGER_SCHEMA)
+    return conn
+
+def profile_key(profile_text):
+    """Key a profile by its text, ignoring case and whitespace differences"""
+    normalized = re.sub(r"\s+", " ", profile_text or "").strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def filter_unnotified(recipient, key, tenders_df, db_path=tender_store.TENDERS_DB):
+    """
+    Drop tenders already notified to a recipient for a profile. A tender whose
+    content hash changed since it was notified counts as new.
+    """
+    if tenders_df.empty:
+        return tenders_df
+    tender_ids = tenders_df["tender_id"].astype(str).tolist()
+    notified = set()
+    conn = _get_connection(db_path)
+    try:
+        for start in range(0, len(tender_ids), tender_store.SQLITE_MAX_PARAMS):
+            chunk = tender_ids[start:start + tender_store.SQLITE_MAX_PARAMS]
+            rows = conn.execute(
+                f"SELECT tender_id, content_hash FROM notification_ledger "
+                f"WHERE recipient = ? AND profile_key = ? AND tender_id IN ({', '.join('?' * len(chunk))})",
+                [recipient, key] + chunk
+            )
+            notified.update(rows)
+    finally:
+        conn.close()
+    
+    pairs = zip(tender_ids, tenders_df["content_hash"].astype(str))
+    return tenders_df[[pair not in notified for pair in pairs]]
+
+def record_notified(recipient, key, tenders_df, db_path=tender_store.TENDERS_DB):
+    """Add tenders to the ledger as notified to a recipient for a profile"""
+    notified_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    conn = _get_connection(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO notification_ledger (recipient, profile_key, tender_id, content_hash, notified_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(recipient, key, str(tender_id), str(content_hash), notified_at)
+                 for tender_id, content_hash in zip(tenders_df["tender_id"], tenders_df["content_hash"])]
+            )
+    finally:
+        conn.close()
+
+def send_new_matches(dispatcher, recipient, profile_text, matches_df, db_path=tender_store.TENDERS_DB, on_sent=None):
+    """
+    Queue a digest of the matches not yet notified to a recipient for a profile.
+    They are added to the ledger once the digest is sent, and on_sent, if given,
+    is called after that. Returns the number queued.
+    """
+    key = profile_key(profile_text)
+    new_matches = filter_unnotified(recipient, key, matches_df, db_path)
+    if new_matches.empty:
+        return 0
+    
+    def delivered():
+        record_notified(recipient, key, new_matches, db_path)
+        if on_sent is not None:
+            on_sent()
+    
+    dispatcher.submit_digest(recipient, new_matches, on_sent=delivered)
+    return len(new_matches)
+
+def subscribe(recipient, profile_text, threshold=DEFAULT_ALERT_THRESHOLD, db_path=tender_store.TENDERS_DB):
+    """Subscribe a recipient to nightly alerts for a profile (updating the threshold if already subscribed)"""
+    conn = _get_connection(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO alert_subscriptions (recipient, profile_key, profile_text, threshold) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(recipient, profile_key) DO UPDATE SET threshold = excluded.threshold",
+                (recipient, profile_key(profile_text), profile_text, float(threshold))
+            )
+    finally:
+        conn.close()
+
+def get_subscriptions(db_path=tender_store.TENDERS_DB):
+    """Return all alert subscriptions"""
+    conn = _get_connection(db_path)
+    try:
+        return pd.read_sql_query("SELECT * FROM alert_subscriptions ORDER BY recipient, profile_key", conn)
+    finally:
+        conn.close()
+
+def _set_last_seen(recipient, key, last_seen, db_path):
+    """Advance a subscription's watermark; it never moves backwards"""
+    conn = _get_connection(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE alert_subscriptions SET last_seen = ? "
+                "WHERE recipient = ? AND profile_key = ? AND (last_seen IS NULL OR last_seen < ?)",
+                (last_seen, recipient, key, last_seen)
+            )
+    finally:
+        conn.close()
+
+def run_alerts(dispatcher, vectorizer, k=MAX_MATCH_RESULTS, db_path=tender_store.TENDERS_DB):
+    """
+    Alert every subscription about new matches. Only tenders written since a
+    subscription's last delivered run are scored, and the ledger drops matches
+    already notified, so each run sends just the deltas. All profiles are
+    scored in one batch. A subscription's watermark only advances once its
+    digest is sent, so matches from a failed delivery are retried on the next
+    run. Returns the number of tenders queued.
+    """
+    subscriptions = get_subscriptions(db_path).to_dict("records")
+    if not subscriptions:
+        return 0
+    watermarks = [None if pd.isna(subscription["last_seen"]) else subscription["last_seen"]
+                  for subscription in subscriptions]
+    
+    # One candidate set covering the oldest watermark, narrowed per subscription below
+    oldest = None if None in watermarks else min(watermarks)
+    candidates = tender_store.query_tenders(
+        canonical_only=True, active_only=True, updated_since=oldest, db_path=db_path
+    ).reset_index(drop=True)
+    if candidates.empty:
+        return 0
+    new_watermark = candidates["updated_at"].max()
+    
+    # Each profile's top k must survive dropping the candidates its own watermark excludes.
+    # updated_at has one-second resolution, so tenders written in the watermark's
+    # second are kept; the ledger drops the ones already notified
+    updated_at = candidates["updated_at"].to_numpy(dtype=object)
+    excluded = [0 if watermark is None else int((updated_at < watermark).sum()) for watermark in watermarks]
+    results = batch_match_profiles(
+        [subscription["profile_text"] for subscription in subscriptions], candidates, vectorizer,
+        k=k + max(excluded), threshold=min(subscription["threshold"] for subscription in subscriptions)
+    )
+    
+    queued = 0
+    for position, (subscription, watermark) in enumerate(zip(subscriptions, watermarks)):
+        matches = results[position]
+        keep = matches["match_score"] >= subscription["threshold"]
+        if watermark is not None:
+            keep &= matches["updated_at"] >= watermark
+        matches = matches[keep].head(k)
+        
+        recipient, key = subscription["recipient"], subscription["profile_key"]
+        advance = lambda recipient=recipient, key=key: _set_last_seen(recipient, key, new_watermark, db_path)
+        sent = send_new_matches(dispatcher, recipient, subscription["profile_text"], matches, db_path, on_sent=advance)
+        if not sent:
+            # Nothing to deliver, so nothing can be lost by moving on
+            advance()
+        queued += sent
+    
+    logger.info(f"Alert run queued {queued} new tender matches")
+    return queued
@@ -8,19 +8,23 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Email server configuration
+# This is a placeholder - in a real implementation, you'd use OAuth2 or API keys
+# for Gmail or other email service
+SMTP_SERVER = "smtp.gmail.com"
+SMTP_PORT = 587
+SENDER_EMAIL = "your-app-email@gmail.com"  # Replace with your email
+APP_PASSWORD = "your-app-password"  # Replace with app password
+
 def send_email_notification(recipient_email, tender_info):
     """
     Send email notification for matching tenders
     """
-    # This is a placeholder - in a real implementation, you'd use OAuth2 or API keys
-    # for Gmail or other email service
-    
     try:
-        # Email server configuration
-        smtp_server = "smtp.gmail.com"
-        smtp_port = 587
-        sender_email = "your-app-email@gmail.com"  # Replace with your email
-        app_password = "your-app-password"  # Replace with app password
+        smtp_server = SMTP_SERVER
+        smtp_port = SMTP_PORT
+        sender_email = SENDER_EMAIL
+        app_password = APP_PASSWORD
         
         # Create message
         msg = MIMEMultipart()
@@ -0,0 +1,272 @@
+# recommendation/embeddings.py
+# Dense embedding backend with an approximate nearest-neighbour (IVF) index
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+import numpy as np
+import pandas as pd
+import tempfile
+import shutil
+import json
+import os
+import logging
+
+from storage import tender_store
+from recommendation.matcher import select_top_k, MAX_MATCH_RESULTS
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = "data"
+EMBEDDINGS_DIR = os.path.join(DATA_DIR, "embeddings")
+EMBEDDING_DTYPE = np.float16      # on-disk dtype; scores are computed in float32
+ENCODE_BATCH_SIZE = 1024          # tenders encoded per batch while building the index
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 50000
+DEFAULT_NPROBE = 8                # inverted lists scanned per query
+DEFAULT_EMBEDDING_MODEL = "hashing"
+
+# Registry of embedding models: name -> model class
+EMBEDDING_MODELS = {}
+
+def register_embedding_model(name):
+    """Register an embedding model class under a name"""
+    def decorator(cls):
+        cls.name = name
+        EMBEDDING_MODELS[name] = cls
+        return cls
+    return decorator
+
+def get_embedding_model(name=DEFAULT_EMBEDDING_MODEL, **kwargs):
+    """Instantiate a registered embedding model by name"""
+    if name not in EMBEDDING_MODELS:
+        raise ValueError(f"Unknown embedding model: {name}")
+    return EMBEDDING_MODELS[name](**kwargs)
+
+@register_embedding_model("hashing")
+class HashingEmbeddingModel:
+    """
+    CPU-only stand-in model: hashed n-gram counts projected to a dense vector
+    with a fixed random Gaussian matrix. Deterministic and dependency-free,
+    for tests and for deployments without a transformer model.
+    """
+    
+    def __init__(self, dim=256, n_features=2 ** 15, seed=42):
+        self.dim = dim
+        self.model_id = f"hashing-{dim}-{n_features}-{seed}"
+        self.hasher = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            stop_words='english',
+            alternate_sign=False,
+            norm=None
+        )
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((n_features, dim), dtype=np.float32) / np.sqrt(dim)
+    
+    def encode(self, texts):
+        counts = self.hasher.transform(texts)
+        counts.data = np.log1p(counts.data)
+        return normalize(np.asarray(counts @ self.projection, dtype=np.float32))
+
+@register_embedding_model("sentence-transformers")
+class SentenceTransformerModel:
+    """Transformer sentence embeddings (BERT family) via sentence-transformers"""
+    
+    def __init__(self, model_name="all-MiniLM-L6-v2", device="cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("Install sentence-transformers to use transformer embeddings") from e
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.model_id = f"sentence-transformers-{model_name}"
+    
+    def encode(self, texts):
+        return self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+def _tender_texts(tenders_df):
+    return (tenders_df["title"] + " " + tenders_df["description"].fillna("")).tolist()
+
+def _spherical_kmeans(vectors, n_lists, rng):
+    """Cluster unit vectors by cosine similarity; returns unit centroids"""
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]
+        centroids = normalize(sums)
+    return centroids.astype(np.float32)
+
+class IVFIndex:
+    """
+    Inverted-file ANN index over a memory-mapped embedding matrix.
+    Rows are grouped under their nearest k-means centroid; a query scans
+    only the nprobe lists whose centroids are closest to it.
+    """
+    
+    def __init__(self, embeddings, centroids, list_offsets, list_rows, tender_ids, meta):
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.tender_ids = tender_ids
+        self.meta = meta
+    
+    @classmethod
+    def load(cls, index_dir=EMBEDDINGS_DIR):
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r" if name == "embeddings" else None)
+            for name in ("embeddings", "centroids", "list_offsets", "list_rows", "tender_ids")
+        }
+        return cls(meta=meta, **arrays)
+    
+    def search(self, query_vector, k=MAX_MATCH_RESULTS, threshold=0.0, nprobe=DEFAULT_NPROBE):
+        """Return (row positions, scores) of the approximate top k, best first"""
+        query_vector = np.asarray(query_vector, dtype=np.float32).ravel()
+        if not len(self.centroids):
+            # Index of an empty store
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        nprobe = min(nprobe, len(self.centroids))
+        probe_lists = np.argpartition(-(self.centroids @ query_vector), nprobe - 1)[:nprobe]
+        
+        candidates = np.concatenate([
+            self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe_lists
+        ])
+        candidates.sort()  # sequential reads from the memory map
+        scores = np.asarray(self.embeddings[candidates], dtype=np.float32) @ query_vector
+        
+        best = select_top_k(scores, k, threshold)
+        return candidates[best], scores[best]
+
+def _write_index(tmp_dir, tenders_df, model, store_version, n_lists):
+    """Encode tenders and write the IVF index files into a staging directory"""
+    texts = _tender_texts(tenders_df)
+    n_tenders = len(texts)
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(tmp_dir, "embeddings.npy"), mode="w+", dtype=EMBEDDING_DTYPE, shape=(n_tenders, model.dim)
+    )
+    for start in range(0, n_tenders, ENCODE_BATCH_SIZE):
+        embeddings[start:start + ENCODE_BATCH_SIZE] = model.encode(texts[start:start + ENCODE_BATCH_SIZE])
+    embeddings.flush()
+    
+    # Coarse quantizer trained on a sample; about sqrt(N) lists. An empty store gets an empty index
+    rng = np.random.default_rng(0)
+    centroids = np.zeros((0, model.dim), dtype=np.float32)
+    if n_tenders:
+        n_lists = max(1, min(n_lists or int(np.sqrt(n_tenders)), n_tenders))
+        sample = np.sort(rng.choice(n_tenders, min(n_tenders, KMEANS_SAMPLE_SIZE), replace=False)).astype(np.int64)
+        centroids = _spherical_kmeans(np.asarray(embeddings[sample], dtype=np.float32), n_lists, rng)
+    
+    assignments = np.empty(n_tenders, dtype=np.int64)
+    for start in range(0, n_tenders, ENCODE_BATCH_SIZE):
+        batch = np.asarray(embeddings[start:start + ENCODE_BATCH_SIZE], dtype=np.float32)
+        assignments[start:start + ENCODE_BATCH_SIZE] = np.argmax(batch @ centroids.T, axis=1)
+    
+    list_rows = np.argsort(assignments, kind="stable")
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+    
+    np.save(os.path.join(tmp_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(tmp_dir, "list_offsets.npy"), list_offsets)
+    np.save(os.path.join(tmp_dir, "list_rows.npy"), list_rows)
+    np.save(os.path.join(tmp_dir, "tender_ids.npy"), tenders_df["tender_id"].to_numpy(dtype=str))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"model_id": model.model_id, "dim": model.dim, "store_version": store_version}, f)
+    del embeddings
+
+def build_embedding_index(tenders_df, model=None, store_version=None, n_lists=None, index_dir=EMBEDDINGS_DIR):
+    """
+    Encode tenders in batches into a float16 memory-mapped matrix and train
+    an IVF index over it. Returns the loaded IVFIndex.
+    """
+    model = model or get_embedding_model()
+    if store_version is None:
+        store_version = tender_store.get_store_version()
+    
+    logger.info(f"Building {model.model_id} embedding index for {len(tenders_df)} tenders...")
+    
+    # Each build stages in its own directory, so concurrent builds cannot mix their files
+    parent_dir = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(index_dir) + ".tmp-", dir=parent_dir)
+    try:
+        _write_index(tmp_dir, tenders_df, model, store_version, n_lists)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    
+    # Swap the new index in; readers see either the old or the new directory
+    old_dir = tmp_dir + ".old"
+    try:
+        os.rename(index_dir, old_dir)
+    except FileNotFoundError:
+        pass
+    try:
+        os.rename(tmp_dir, index_dir)
+    except OSError:
+        # Another build published its index in the meantime; keep that one
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    
+    return IVFIndex.load(index_dir)
+
+def load_embedding_index(model, store_version=None, index_dir=EMBEDDINGS_DIR):
+    """Load the persisted index if it was built by this model for this store version"""
+    try:
+        index = IVFIndex.load(index_dir)
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f"Embedding index unavailable: {str(e)}")
+        return None
+    if index.meta["model_id"] != model.model_id:
+        return None
+    if store_version is not None and index.meta["store_version"] != store_version:
+        return None
+    return index
+
+def refresh_embedding_index(store_version, model=None, index_dir=EMBEDDINGS_DIR, db_path=tender_store.TENDERS_DB):
+    """
+    Bring the index up to date with a store version, building it over the open
+    canonical tenders (the ones users are matched against) unless it is current.
+    Run by the scheduler and the app's inline refresh, never inside a match request.
+    """
+    model = model or get_embedding_model()
+    index = load_embedding_index(model, store_version, index_dir)
+    if index is None:
+        tenders_df = tender_store.query_tenders(
+            columns=["tender_id", "title", "description"], canonical_only=True, active_only=True, db_path=db_path
+        )
+        index = build_embedding_index(tenders_df, model, store_version, index_dir=index_dir)
+    return index
+
+def semantic_top_k_matches(profile_text, tenders_df, index, model=None, k=MAX_MATCH_RESULTS, threshold=0.0,
+                           nprobe=DEFAULT_NPROBE):
+    """
+    Match a company profile against available tenders by embedding similarity
+    Returns the approximate k best tenders with a match_score column, like
+    top_k_matches(). The index comes from load_embedding_index().
+    """
+    logger.info("Matching profile to tenders semantically...")
+    
+    model = model or get_embedding_model()
+    query_vector = model.encode([profile_text])[0]
+    tender_rows = pd.Index(tenders_df["tender_id"])
+    
+    # Indexed tenders outside tenders_df are dropped, so widen the search
+    # until k of them are left or the probed lists run out
+    fetch = k
+    while True:
+        positions, scores = index.search(query_vector, k=fetch, threshold=threshold, nprobe=nprobe)
+        rows = tender_rows.get_indexer(index.tender_ids[positions])
+        found = rows >= 0
+        if found.sum() >= k or len(positions) < fetch:
+            break
+        fetch *= 2
+    rows, scores = rows[found][:k], scores[found][:k]
+    
+    result_df = tenders_df.iloc[rows].copy()
+    result_df["match_score"] = scores.astype(np.float64)
+    return result_df
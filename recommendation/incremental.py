@@ -0,0 +1,89 @@
+# recommendation/incremental.py
+# Incrementally updatable TF-IDF vectorizer for tender matching
+
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from datetime import datetime, timezone
+from scipy import sparse
+import numpy as np
+import uuid
+
+# Constants
+N_FEATURES = 2 ** 18
+
+class IncrementalTfidfVectorizer:
+    """
+    TF-IDF over hashed n-gram features with a running document-frequency table.
+    
+    Term counts come from a stateless HashingVectorizer, so new tenders are
+    vectorized without refitting and stored count rows stay valid forever.
+    Only the IDF weights move as documents are added (partial_fit) or
+    removed (forget); they are applied when counts are weighted.
+    """
+    
+    def __init__(self, n_features=N_FEATURES, ngram_range=(1, 2), stop_words='english'):
+        self.hasher = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            stop_words=stop_words,
+            alternate_sign=False,
+            norm=None
+        )
+        self.n_features = n_features
+        self.document_frequency = np.zeros(n_features, dtype=np.int64)
+        self.n_documents = 0
+        self.last_full_fit = None
+        # Ties persisted count matrices to this hashing configuration
+        self.fingerprint_ = uuid.uuid4().hex
+    
+    def count(self, texts):
+        """Hashed term counts for a list of texts, one CSR row per text"""
+        counts = self.hasher.transform(texts)
+        counts.sum_duplicates()
+        return counts
+    
+    def _document_counts(self, counts):
+        return np.bincount(counts.indices, minlength=self.n_features)
+    
+    def fit(self, texts=None, counts=None):
+        """Recompute document frequencies from scratch"""
+        counts = self.count(texts) if counts is None else counts
+        self.document_frequency = self._document_counts(counts).astype(np.int64)
+        self.n_documents = counts.shape[0]
+        self.last_full_fit = datetime.now(timezone.utc)
+        return self
+    
+    def partial_fit(self, texts=None, counts=None):
+        """Add documents to the document-frequency table"""
+        counts = self.count(texts) if counts is None else counts
+        self.document_frequency += self._document_counts(counts)
+        self.n_documents += counts.shape[0]
+        return self
+    
+    def forget(self, texts=None, counts=None):
+        """Remove documents (expired or superseded tenders) from the table"""
+        counts = self.count(texts) if counts is None else counts
+        self.document_frequency -= self._document_counts(counts)
+        np.maximum(self.document_frequency, 0, out=self.document_frequency)
+        self.n_documents = max(0, self.n_documents - counts.shape[0])
+        return self
+    
+    @property
+    def idf_(self):
+        """Smoothed IDF, as computed by sklearn's TfidfTransformer"""
+        return np.log((1 + self.n_documents) / (1 + self.document_frequency)) + 1
+    
+    def weight(self, counts):
+        """Turn hashed counts into L2-normalized TF-IDF rows"""
+        if counts.shape[0] == 0:
+            # normalize() rejects matrices without rows
+            return sparse.csr_matrix((0, self.n_features))
+        return normalize(sparse.csr_matrix(counts) @ sparse.diags(self.idf_), norm="l2", copy=False)
+    
+    def fit_transform(self, texts):
+        counts = self.count(texts)
+        self.fit(counts=counts)
+        return self.weight(counts)
+    
+    def transform(self, texts):
+        return self.weight(self.count(texts))
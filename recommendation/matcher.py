@@ -2,49 +2,372 @@
 # Recommendation system for matching company profiles to tenders
 
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import pandas as pd
 import pickle
+import shutil
+import uuid
+import json
 import os
 import logging
 
+from storage import tender_store
+from recommendation.incremental import IncrementalTfidfVectorizer
+from data_processing.normalizer import emd_rupees
+from monitoring import metrics
+
 logger = logging.getLogger(__name__)
 
 # Constants
 DATA_DIR = "data"
 VECTORIZER_FILE = os.path.join(DATA_DIR, "vectorizer.pkl")
+TENDER_VECTORS_DIR = os.path.join(DATA_DIR, "tender_vectors")
+FIELD_VECTORS_DIR = os.path.join(DATA_DIR, "tender_field_vectors")
+MATCH_FIELDS = {
+    "title_match": "title",
+    "description_match": "description",
+    "organization_match": "organization"
+}
+MAX_MATCH_RESULTS = 100
+MATCH_MEMORY_BUDGET_MB = 256  # dense score block held per batch-matching chunk
+FULL_REFIT_INTERVAL = timedelta(days=7)  # incremental vectorizers are refit from scratch this often
+
+# Tender matrix shared with batch-matching worker processes
+_worker_tender_vectors = None
+
+def _tender_texts(tenders_df):
+    # Combine title and description for better context
+    return tenders_df["title"] + " " + tenders_df["description"].fillna("")
+
+def _content_hashes(tenders_df):
+    if "content_hash" in tenders_df:
+        return tenders_df["content_hash"].fillna("")
+    return [""] * len(tenders_df)
 
-def train_vectorizer(tenders_df):
+@metrics.timed("persist_vectorizer")
+def save_vectorizer(vectorizer):
+    """Save vectorizer for later use"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_file = VECTORIZER_FILE + ".tmp"
+    with open(tmp_file, "wb") as f:
+        pickle.dump(vectorizer, f)
+    os.replace(tmp_file, VECTORIZER_FILE)
+
+def load_vectorizer():
+    """Load the saved vectorizer, or None if there is none"""
+    try:
+        with open(VECTORIZER_FILE, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+def train_vectorizer(tenders_df, store_version=None, incremental=False):
     """
     Train a TF-IDF vectorizer on tender descriptions
+    The tender matrix is computed in the same pass and persisted next to the
+    vectorizer, tagged with the tender store version it was built from.
+    
+    With incremental=True a hashed IncrementalTfidfVectorizer is fitted instead;
+    its persisted matrix holds raw term counts that update_vectorizer() can
+    extend without refitting.
     """
     logger.info("Training TF-IDF vectorizer...")
     
-    # Combine title and description for better context
-    texts = tenders_df["title"] + " " + tenders_df["description"].fillna("")
+    if store_version is None:
+        store_version = tender_store.get_store_version()
+    
+    texts = _tender_texts(tenders_df)
+    
+    with metrics.timed("vectorize"):
+        if incremental:
+            vectorizer = IncrementalTfidfVectorizer()
+            tender_vectors = vectorizer.count(texts)
+            vectorizer.fit(counts=tender_vectors)
+            kind = "counts"
+        else:
+            # Create and fit vectorizer
+            vectorizer = TfidfVectorizer(
+                max_features=5000,
+                stop_words='english',
+                ngram_range=(1, 2)
+            )
+            tender_vectors = vectorizer.fit_transform(texts)
+            
+            # Ties the persisted tender matrix to this exact vectorizer
+            vectorizer.fingerprint_ = uuid.uuid4().hex
+            kind = "tfidf"
+    metrics.increment("vectors_built", len(tenders_df), kind=kind)
     
-    # Create and fit vectorizer
-    vectorizer = TfidfVectorizer(
-        max_features=5000,
-        stop_words='english',
-        ngram_range=(1, 2)
+    save_vectorizer(vectorizer)
+    save_tender_vectors(
+        tender_vectors, tenders_df["tender_id"], store_version, vectorizer.fingerprint_,
+        content_hashes=_content_hashes(tenders_df), kind=kind
     )
-    vectorizer.fit(texts)
     
-    # Save vectorizer for later use
-    os.makedirs(DATA_DIR, exist_ok=True)
-    with open(VECTORIZER_FILE, "wb") as f:
-        pickle.dump(vectorizer, f)
+    return vectorizer
+
+def update_vectorizer(vectorizer, store_version=None, incremental=None):
+    """
+    Bring a vectorizer and its persisted tender matrix up to date with the store.
+    
+    An IncrementalTfidfVectorizer only vectorizes tenders that are new or whose
+    content hash changed, and forgets removed or superseded ones, so the work
+    grows with the number of changes. It is refit from scratch once
+    FULL_REFIT_INTERVAL has passed. Any other vectorizer is retrained.
+    incremental switches the kind of vectorizer; None keeps the current kind.
+    """
+    if store_version is None:
+        store_version = tender_store.get_store_version()
+    if incremental is None:
+        incremental = isinstance(vectorizer, IncrementalTfidfVectorizer)
+    
+    full_refit_due = (
+        not incremental
+        or not isinstance(vectorizer, IncrementalTfidfVectorizer)
+        or vectorizer.last_full_fit is None
+        or datetime.now(timezone.utc) - vectorizer.last_full_fit >= FULL_REFIT_INTERVAL
+    )
+    persisted = None if full_refit_due else load_tender_vectors(vectorizer)
+    if persisted is None:
+        tenders_df = tender_store.query_tenders(columns=["tender_id", "title", "description", "content_hash"])
+        return train_vectorizer(tenders_df, store_version, incremental=incremental)
+    
+    counts, tender_ids, content_hashes = persisted
+    current = tender_store.query_tenders(columns=["tender_id", "content_hash"])
+    
+    # Rows to keep are those whose tender still exists with the same content
+    current_hashes = dict(zip(current["tender_id"], current["content_hash"]))
+    keep = np.array([current_hashes.get(tender_id) == content_hash
+                     for tender_id, content_hash in zip(tender_ids, content_hashes)], dtype=bool)
+    kept_ids = set(tender_ids[keep])
+    changed_ids = [tender_id for tender_id in current["tender_id"] if tender_id not in kept_ids]
     
+    logger.info(f"Updating vectorizer: {len(changed_ids)} new or changed, {int((~keep).sum())} removed or superseded")
+    
+    # Forget superseded and removed tenders, then add the new versions
+    if not keep.all():
+        vectorizer.forget(counts=counts[np.flatnonzero(~keep)])
+    
+    changed_parts = []
+    for start in range(0, len(changed_ids), tender_store.SQLITE_MAX_PARAMS):
+        changed_parts.append(tender_store.query_tenders(
+            columns=["tender_id", "title", "description", "content_hash"],
+            tender_ids=changed_ids[start:start + tender_store.SQLITE_MAX_PARAMS]
+        ))
+    changed_df = pd.concat(changed_parts, ignore_index=True) if changed_parts else current.iloc[:0]
+    with metrics.timed("vectorize"):
+        new_counts = vectorizer.count(_tender_texts(changed_df)) if len(changed_df) else None
+        if new_counts is not None:
+            vectorizer.partial_fit(counts=new_counts)
+    metrics.increment("vectors_built", len(changed_df), kind="counts")
+    
+    kept_rows = np.flatnonzero(keep)
+    counts = sparse.vstack([counts[kept_rows]] + ([new_counts] if new_counts is not None else []), format="csr")
+    tender_ids = np.concatenate([tender_ids[kept_rows], changed_df["tender_id"].to_numpy(dtype=str)])
+    content_hashes = np.concatenate([content_hashes[kept_rows], np.asarray(_content_hashes(changed_df), dtype=str)])
+    
+    save_vectorizer(vectorizer)
+    save_tender_vectors(counts, tender_ids, store_version, vectorizer.fingerprint_,
+                        content_hashes=content_hashes, kind="counts")
     return vectorizer
 
-def get_tender_vectors(tenders_df, vectorizer):
+@metrics.timed("persist_vectors")
+def save_tender_vectors(tender_vectors, tender_ids, store_version, fingerprint, content_hashes=None,
+                        kind="tfidf", vectors_dir=TENDER_VECTORS_DIR):
+    """
+    Persist a CSR tender matrix as raw .npy arrays so it can be memory-mapped,
+    together with the tender ids and content hashes of its rows and the
+    versions it belongs to. kind is "tfidf" for weighted rows or "counts"
+    for raw hashed counts of an IncrementalTfidfVectorizer.
+    """
+    if content_hashes is None:
+        content_hashes = [""] * len(tender_ids)
+    tender_vectors = sparse.csr_matrix(tender_vectors)
+    tmp_dir = vectors_dir + ".tmp"
+    old_dir = vectors_dir + ".old"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    np.save(os.path.join(tmp_dir, "data.npy"), tender_vectors.data)
+    np.save(os.path.join(tmp_dir, "indices.npy"), tender_vectors.indices)
+    np.save(os.path.join(tmp_dir, "indptr.npy"), tender_vectors.indptr)
+    np.save(os.path.join(tmp_dir, "tender_ids.npy"), np.asarray(tender_ids, dtype=str))
+    np.save(os.path.join(tmp_dir, "content_hashes.npy"), np.asarray(content_hashes, dtype=str))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "kind": kind,
+            "shape": list(tender_vectors.shape),
+            "store_version": store_version,
+            "vectorizer_fingerprint": fingerprint
+        }, f)
+    
+    # Swap the new matrix in; readers see either the old or the new directory
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(vectors_dir):
+        os.rename(vectors_dir, old_dir)
+    os.rename(tmp_dir, vectors_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+def load_tender_vectors(vectorizer, store_version=None, vectors_dir=TENDER_VECTORS_DIR):
+    """
+    Memory-map the persisted tender matrix.
+    Returns (tender_vectors, tender_ids, content_hashes), or None when it is
+    missing or was built from a different vectorizer or tender store version.
+    """
+    meta_file = os.path.join(vectors_dir, "meta.json")
+    try:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        
+        if meta["vectorizer_fingerprint"] != getattr(vectorizer, "fingerprint_", None):
+            return None
+        if store_version is not None and meta["store_version"] != store_version:
+            return None
+        
+        arrays = [
+            np.load(os.path.join(vectors_dir, f"{name}.npy"), mmap_mode="r")
+            for name in ("data", "indices", "indptr")
+        ]
+        tender_ids = np.load(os.path.join(vectors_dir, "tender_ids.npy"))
+        content_hashes = np.load(os.path.join(vectors_dir, "content_hashes.npy"))
+    except (OSError, ValueError, KeyError) as e:
+        logger.debug(f"Persisted tender vectors unavailable: {str(e)}")
+        return None
+    
+    tender_vectors = sparse.csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+    return tender_vectors, tender_ids, content_hashes
+
+def get_tender_vectors(tenders_df, vectorizer, store_version=None):
     """
     Convert tender descriptions to TF-IDF vectors
+    Rows come from the tender matrix persisted for store_version (the live
+    store version by default); only when it is missing are the texts
+    transformed again.
+    """
+    if store_version is None:
+        store_version = tender_store.get_store_version()
+    persisted = load_tender_vectors(vectorizer, store_version)
+    if persisted is not None:
+        tender_vectors, tender_ids, _ = persisted
+        wanted_ids = tenders_df["tender_id"].to_numpy(dtype=str)
+        if len(wanted_ids) != len(tender_ids) or not np.array_equal(wanted_ids, tender_ids):
+            positions = pd.Index(tender_ids).get_indexer(wanted_ids)
+            tender_vectors = tender_vectors[positions] if (positions >= 0).all() else None
+        
+        if tender_vectors is not None:
+            # Incremental vectorizers persist raw counts and weight them with the current IDF
+            if isinstance(vectorizer, IncrementalTfidfVectorizer):
+                return vectorizer.weight(tender_vectors)
+            return tender_vectors
+    
+    return vectorizer.transform(_tender_texts(tenders_df))
+
+def score_tenders(profile_text, tender_vectors, vectorizer):
+    """
+    Cosine similarity of a profile against every tender row.
+    TF-IDF rows are L2-normalized, so this is a single sparse dot product.
+    """
+    profile_vector = vectorizer.transform([profile_text])
+    return (tender_vectors @ profile_vector.T).toarray().ravel()
+
+def select_top_k(scores, k, threshold=0.0):
+    """
+    Return the positions of the k highest scores at or above threshold, best first.
+    Uses argpartition, so only the winners are sorted.
+    """
+    candidates = np.flatnonzero(scores >= threshold)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    # Best score first, ties in tender order
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+@metrics.timed("match")
+def top_k_matches(profile_text, tenders_df, vectorizer, k=MAX_MATCH_RESULTS, threshold=0.0, store_version=None):
+    """
+    Match a company profile against available tenders
+    Returns only the k best tenders scoring at or above threshold, with
+    similarity scores, without copying or sorting the whole dataframe.
+    store_version selects the persisted tender vectors (see get_tender_vectors).
+    """
+    logger.info("Matching profile to top tenders...")
+    
+    if tenders_df.empty:
+        return tenders_df.assign(match_score=pd.Series(dtype=float))
+    
+    tender_vectors = get_tender_vectors(tenders_df, vectorizer, store_version)
+    scores = score_tenders(profile_text, tender_vectors, vectorizer)
+    positions = select_top_k(scores, k, threshold)
+    
+    result_df = tenders_df.iloc[positions].copy()
+    result_df["match_score"] = scores[positions]
+    return result_df
+
+def _top_k_chunk(profile_chunk, tender_vectors_t, k, threshold):
+    """Score a chunk of profiles against all tenders and keep each row's top k"""
+    scores = (profile_chunk @ tender_vectors_t).toarray()
+    results = []
+    for row in scores:
+        positions = select_top_k(row, k, threshold)
+        results.append((positions, row[positions]))
+    return results
+
+def _init_batch_worker(tender_vectors_t):
+    global _worker_tender_vectors
+    _worker_tender_vectors = tender_vectors_t
+
+def _top_k_chunk_in_worker(profile_chunk, k, threshold):
+    return _top_k_chunk(profile_chunk, _worker_tender_vectors, k, threshold)
+
+@metrics.timed("batch_match")
+def batch_match_profiles(profiles, tenders_df, vectorizer, k=MAX_MATCH_RESULTS, threshold=0.0,
+                         memory_budget_mb=MATCH_MEMORY_BUDGET_MB, n_jobs=1, store_version=None):
+    """
+    Match many company profiles against the tenders in a few sparse matrix products.
+    profiles is a dict of profile id -> profile text (or a list of texts, keyed by
+    position). Profiles are scored in row chunks sized so each dense score block
+    fits in memory_budget_mb; with n_jobs > 1 the chunks run in a process pool.
+    store_version selects the persisted tender vectors (see get_tender_vectors).
+    Returns a dict of profile id -> dataframe of its top k tenders with match scores.
     """
-    texts = tenders_df["title"] + " " + tenders_df["description"].fillna("")
-    return vectorizer.transform(texts)
+    if not isinstance(profiles, dict):
+        profiles = dict(enumerate(profiles))
+    if not profiles:
+        return {}
+    
+    logger.info(f"Batch matching {len(profiles)} profiles to tenders...")
+    
+    profile_ids = list(profiles)
+    profile_vectors = vectorizer.transform([profiles[profile_id] for profile_id in profile_ids])
+    tender_vectors_t = get_tender_vectors(tenders_df, vectorizer, store_version).T.tocsr()
+    
+    # Each chunk holds a dense (rows x tenders) float64 score block
+    n_jobs = max(1, n_jobs)
+    budget_bytes = memory_budget_mb * 1024 * 1024 // n_jobs
+    chunk_rows = max(1, budget_bytes // (max(1, len(tenders_df)) * 8))
+    chunks = [profile_vectors[start:start + chunk_rows] for start in range(0, len(profile_ids), chunk_rows)]
+    
+    if n_jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(n_jobs, len(chunks)),
+            initializer=_init_batch_worker,
+            initargs=(tender_vectors_t,)
+        ) as executor:
+            chunk_results = executor.map(_top_k_chunk_in_worker, chunks, [k] * len(chunks), [threshold] * len(chunks))
+            top_k = [result for chunk in chunk_results for result in chunk]
+    else:
+        top_k = [result for chunk in chunks for result in _top_k_chunk(chunk, tender_vectors_t, k, threshold)]
+    
+    results = {}
+    for profile_id, (positions, scores) in zip(profile_ids, top_k):
+        result_df = tenders_df.iloc[positions].copy()
+        result_df["match_score"] = scores
+        results[profile_id] = result_df
+    return results
 
+@metrics.timed("match")
 def match_profile_to_tenders(profile_text, tenders_df, vectorizer):
     """
     Match a company profile against available tenders
@@ -55,11 +378,8 @@ def match_profile_to_tenders(profile_text, tenders_df, vectorizer):
     # Get tender vectors
     tender_vectors = get_tender_vectors(tenders_df, vectorizer)
     
-    # Convert profile to vector
-    profile_vector = vectorizer.transform([profile_text])
-    
     # Calculate similarity scores
-    sim_scores = cosine_similarity(profile_vector, tender_vectors).flatten()
+    sim_scores = score_tenders(profile_text, tender_vectors, vectorizer)
     
     # Add scores to tenders dataframe
     result_df = tenders_df.copy()
@@ -70,9 +390,60 @@ def match_profile_to_tenders(profile_text, tenders_df, vectorizer):
     
     return result_df
 
-def advanced_matching(profile_text, tenders_df, vectorizer, weights=None):
+def get_field_vectors(tenders_df, vectorizer, fields=MATCH_FIELDS.values()):
+    """
+    Per-field TF-IDF matrices (title, description, organization) for the tenders.
+    Each field matrix is persisted under FIELD_VECTORS_DIR the first time it is
+    built for a store version and memory-mapped afterwards.
+    """
+    store_version = tender_store.get_store_version()
+    is_incremental = isinstance(vectorizer, IncrementalTfidfVectorizer)
+    wanted_ids = tenders_df["tender_id"].to_numpy(dtype=str)
+    
+    field_vectors = {}
+    for field in fields:
+        vectors_dir = os.path.join(FIELD_VECTORS_DIR, field)
+        persisted = load_tender_vectors(vectorizer, store_version, vectors_dir)
+        matrix = None
+        if persisted is not None:
+            matrix, tender_ids, _ = persisted
+            if len(wanted_ids) != len(tender_ids) or not np.array_equal(wanted_ids, tender_ids):
+                positions = pd.Index(tender_ids).get_indexer(wanted_ids)
+                matrix = matrix[positions] if (positions >= 0).all() else None
+        
+        if matrix is None:
+            # Categorical columns (organization) can't be filled with a new value
+            texts = tenders_df[field].astype(object).fillna("")
+            matrix = vectorizer.count(texts) if is_incremental else vectorizer.transform(texts)
+            # Vectorizers pickled before fingerprints existed have none
+            save_tender_vectors(
+                matrix, wanted_ids, store_version, getattr(vectorizer, "fingerprint_", None),
+                content_hashes=_content_hashes(tenders_df),
+                kind="counts" if is_incremental else "tfidf", vectors_dir=vectors_dir
+            )
+        
+        field_vectors[field] = vectorizer.weight(matrix) if is_incremental else matrix
+    return field_vectors
+
+def _deadline_days(tenders_df, today=None):
+    """Days from today until each deadline, NaN when unknown"""
+    column = "deadline_date" if "deadline_date" in tenders_df else "deadline"
+    deadlines = pd.to_datetime(tenders_df[column], errors="coerce")
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+    return ((deadlines - today).dt.days).to_numpy(dtype=float)
+
+@metrics.timed("match")
+def advanced_matching(profile_text, tenders_df, vectorizer, weights=None, emd_range=None, emd_boost=0.1,
+                      deadline_boost=0.0, deadline_horizon_days=30, k=None, threshold=0.0):
     """
     Advanced matching with weighted features
+    
+    The profile is scored against separate title, description and organization
+    matrices, combined as one weighted sparse matrix, so the whole corpus is
+    scored with a single sparse product. Optional boosts are added for tenders
+    whose EMD (in rupees) falls within emd_range = (low, high), and for
+    deadlines closing within deadline_horizon_days (closer scores higher).
+    Returns tenders sorted by weighted_score, or only the k best when k is given.
     """
     if weights is None:
         weights = {
@@ -81,19 +452,33 @@ def advanced_matching(profile_text, tenders_df, vectorizer, weights=None):
             "organization_match": 0.2
         }
     
-    # Get basic match scores
-    basic_matches = match_profile_to_tenders(profile_text, tenders_df, vectorizer)
+    logger.info("Matching profile to tenders with field weights...")
     
-    # Extract key terms from profile (simplified)
-    profile_terms = set(profile_text.lower().split())
+    total_weight = sum(weights.values()) or 1.0
+    field_vectors = get_field_vectors(tenders_df, vectorizer, [MATCH_FIELDS[name] for name in weights])
+    weighted_vectors = sum(
+        (weight / total_weight) * field_vectors[MATCH_FIELDS[name]] for name, weight in weights.items()
+    )
+    
+    profile_vector = vectorizer.transform([profile_text]).T
+    weighted_scores = (weighted_vectors @ profile_vector).toarray().ravel()
+    match_scores = (get_tender_vectors(tenders_df, vectorizer) @ profile_vector).toarray().ravel()
     
-    # Calculate additional feature scores
-    result_df = basic_matches.copy()
+    if emd_range is not None and emd_boost:
+        emd = emd_rupees(tenders_df)
+        low, high = emd_range
+        weighted_scores += emd_boost * ((emd >= low) & (emd <= high))
     
-    # Apply weights to get final score
-    result_df["weighted_score"] = result_df["match_score"]
+    if deadline_boost:
+        days_left = _deadline_days(tenders_df)
+        proximity = np.clip(1 - days_left / deadline_horizon_days, 0, 1)
+        proximity[~(days_left >= 0)] = 0  # closed or unknown deadlines get no boost
+        weighted_scores += deadline_boost * proximity
     
-    # Sort by weighted score
-    result_df = result_df.sort_values("weighted_score", ascending=False)
+    positions = select_top_k(weighted_scores, len(tenders_df) if k is None else k, threshold)
     
-    return result_df
\ No newline at end of file
+    result_df = tenders_df.iloc[positions].copy()
+    result_df["match_score"] = match_scores[positions]
+    result_df["weighted_score"] = weighted_scores[positions]
+    
+    return result_df
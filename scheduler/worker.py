@@ -0,0 +1,198 @@
+# scheduler/worker.py
+# Background worker that scrapes portals on a schedule and publishes snapshots for the app
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_collection.scraper import SCRAPERS, get_all_tenders
+from recommendation.embeddings import refresh_embedding_index
+from recommendation.matcher import load_vectorizer, train_vectorizer, update_vectorizer
+from notification.dispatcher import NotificationDispatcher
+from notification.ledger import run_alerts
+from monitoring import metrics
+from storage import tender_store
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = "data"
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "snapshot.json")
+POLL_INTERVAL = 30  # longest sleep between schedule checks, in seconds
+ALERT_INTERVAL = 24 * 3600  # seconds between alert runs for subscribed profiles
+METRICS_NAME = "scheduler"  # exported as data/metrics/scheduler.prom and .json
+SNAPSHOT_STALE_AFTER = 3600  # seconds without a run after which the scheduler is taken to have stopped
+INCREMENTAL_VECTORIZER = True
+
+def load_snapshot(snapshot_file=SNAPSHOT_FILE):
+    """
+    Return the latest published snapshot, or None if none was published.
+    A snapshot records the tender store version the matching artifacts were
+    built for, when it was published, when the scheduler last ran and when
+    each portal was last scraped.
+    
+    A snapshot pins a store version rather than copying the store: the app
+    keys its caches on that version, so it only switches to artifacts once
+    they are complete, but tender rows are still read from the live store.
+    Rows written after the pinned version are vectorized on the fly, and a
+    copy of the whole store per snapshot is avoided.
+    """
+    try:
+        with open(snapshot_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def publish_snapshot(snapshot, snapshot_file=SNAPSHOT_FILE):
+    """Write a snapshot atomically; readers see either the previous or the new one"""
+    os.makedirs(os.path.dirname(snapshot_file) or ".", exist_ok=True)
+    tmp_file = snapshot_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_file, snapshot_file)
+
+def is_stale(snapshot, now=None):
+    """True when the scheduler has not run for SNAPSHOT_STALE_AFTER, e.g. because it was stopped"""
+    now = now or datetime.now(timezone.utc)
+    last_run = snapshot.get("checked_at") or snapshot.get("published_at")
+    if last_run is None:
+        return True
+    return (now - datetime.fromisoformat(last_run)).total_seconds() > SNAPSHOT_STALE_AFTER
+
+def _seconds_until_due(name, snapshot, now):
+    last_run = (snapshot or {}).get("portals", {}).get(name, {}).get("last_run")
+    if last_run is None:
+        return 0.0
+    elapsed = (now - datetime.fromisoformat(last_run)).total_seconds()
+    return SCRAPERS[name]["interval"] - elapsed
+
+def due_portals(snapshot=None, now=None):
+    """Registered portals whose scrape interval has elapsed since their last run"""
+    now = now or datetime.now(timezone.utc)
+    return [name for name in SCRAPERS if _seconds_until_due(name, snapshot, now) <= 0]
+
+def refresh_artifacts(store_version):
+    """
+    Bring the vectorizer, its persisted tender matrix and the semantic
+    embedding index up to date with a store version. Returns the vectorizer.
+    """
+    vectorizer = load_vectorizer()
+    if vectorizer is None:
+        tenders_df = tender_store.query_tenders(columns=["tender_id", "title", "description", "content_hash"])
+        vectorizer = train_vectorizer(tenders_df, store_version, incremental=INCREMENTAL_VECTORIZER)
+    else:
+        vectorizer = update_vectorizer(vectorizer, store_version, incremental=INCREMENTAL_VECTORIZER)
+    refresh_embedding_index(store_version)
+    return vectorizer
+
+def send_alerts():
+    """Email subscribed profiles their new matches, waiting until the digests are delivered"""
+    vectorizer = load_vectorizer()
+    if vectorizer is None:
+        return 0
+    dispatcher = NotificationDispatcher()
+    try:
+        return run_alerts(dispatcher, vectorizer)
+    finally:
+        dispatcher.close()
+
+def run_once(snapshot_file=SNAPSHOT_FILE, now=None):
+    """
+    Scrape the portals that are due, update the matching artifacts if the store
+    changed, then publish a new snapshot. Alerts are sent once ALERT_INTERVAL
+    has passed since the last alert run. Returns the published snapshot.
+    The worker's metrics are exported after every run, successful or not.
+    """
+    try:
+        with metrics.timed("scheduler_run"):
+            return _run_once(snapshot_file, now)
+    finally:
+        metrics.export_metrics(METRICS_NAME)
+
+def _run_once(snapshot_file, now):
+    now = now or datetime.now(timezone.utc)
+    snapshot = load_snapshot(snapshot_file) or {"store_version": None, "portals": {}}
+    portals = due_portals(snapshot, now)
+    
+    if portals:
+        logger.info(f"Scraping {', '.join(portals)}")
+        stats = get_all_tenders(portals=portals, incremental=True)
+        for name in portals:
+            snapshot["portals"][name] = {"last_run": now.isoformat(timespec="seconds"), "stats": stats}
+    
+    # Closed tenders leave the store as deadlines pass, even when no portal is due
+    tender_store.archive_expired()
+    
+    # Artifacts are rebuilt before the version is published, so the app never
+    # sees a store version whose vectorizer is still being updated
+    store_version = tender_store.get_store_version()
+    version_changed = store_version != snapshot["store_version"]
+    if version_changed:
+        with metrics.timed("refresh_artifacts"):
+            vectorizer = refresh_artifacts(store_version)
+        snapshot["store_version"] = store_version
+        snapshot["vectorizer_fingerprint"] = vectorizer.fingerprint_
+        snapshot["published_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        logger.info(f"Publishing snapshot for store version {store_version}")
+    
+    last_alerts = snapshot.get("alerts_last_run")
+    alerts_due = last_alerts is None or (now - datetime.fromisoformat(last_alerts)).total_seconds() >= ALERT_INTERVAL
+    if alerts_due:
+        with metrics.timed("alerts"):
+            send_alerts()
+        snapshot["alerts_last_run"] = now.isoformat(timespec="seconds")
+    
+    # Published every run, so the app can tell a running scheduler from a stopped one
+    snapshot["checked_at"] = now.isoformat(timespec="seconds")
+    publish_snapshot(snapshot, snapshot_file)
+    return snapshot
+
+def run_forever(snapshot_file=SNAPSHOT_FILE, poll_interval=POLL_INTERVAL):
+    """Run the schedule until interrupted, sleeping until the next portal is due"""
+    logger.info(f"Scheduler started for {', '.join(SCRAPERS)}")
+    while True:
+        try:
+            snapshot = run_once(snapshot_file)
+            now = datetime.now(timezone.utc)
+            wait = min([poll_interval] + [_seconds_until_due(name, snapshot, now) for name in SCRAPERS])
+        except Exception as e:
+            # Keep the schedule alive; the run is retried on the next poll
+            logger.error(f"Scheduled run failed: {str(e)}")
+            wait = poll_interval
+        time.sleep(max(wait, 1.0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape tender portals on a schedule and publish snapshots")
+    parser.add_argument("--once", action="store_true", help="run the due scrapes once and exit")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help="longest sleep between schedule checks, in seconds")
+    parser.add_argument("--metrics-port", type=int,
+                        help="also serve Prometheus metrics at http://localhost:<port>/metrics")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    if args.metrics_port:
+        metrics.serve_metrics(args.metrics_port)
+    
+    if args.once:
+        run_once()
+        return 0
+    try:
+        run_forever(poll_interval=args.poll_interval)
+    except KeyboardInterrupt:
+        logger.info("Scheduler stopped")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
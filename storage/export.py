@@ -0,0 +1,96 @@
+# storage/export.py
+# Chunked CSV/Parquet export of tender query results
+
+import os
+import time
+import uuid
+import logging
+
+import pandas as pd
+
+from data_processing.normalizer import CATEGORICAL_COLUMNS
+from storage import tender_store
+
+logger = logging.getLogger(__name__)
+
+# Constants
+EXPORT_DIR = os.path.join(tender_store.DATA_DIR, "exports")
+EXPORT_CHUNK_SIZE = 5000  # rows read from the store and written at a time
+EXPORT_MAX_AGE = 3600  # seconds an export file is kept for download
+EXPORT_FORMATS = ["csv", "parquet"]
+
+def _parquet_schema(columns):
+    import pyarrow as pa
+    types = {"deadline_date": pa.timestamp("ns"), "emd_paise": pa.int64(), "search_rank": pa.float64()}
+    return pa.schema([(column, types.get(column, pa.string())) for column in columns])
+
+def _write_parquet(chunks, columns, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Install pyarrow to export Parquet") from e
+    
+    rows = 0
+    schema = _parquet_schema(columns)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            # Categories differ between chunks, so they are written as plain strings
+            for column in CATEGORICAL_COLUMNS:
+                if column in chunk:
+                    chunk[column] = chunk[column].astype(object)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+def _write_csv(chunks, columns, path):
+    rows = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        pd.DataFrame(columns=columns).to_csv(f, index=False)
+        for chunk in chunks:
+            chunk.to_csv(f, header=False, index=False)
+            rows += len(chunk)
+    return rows
+
+def prune_exports(export_dir=EXPORT_DIR, max_age=EXPORT_MAX_AGE):
+    """Delete export files older than max_age seconds"""
+    if not os.path.isdir(export_dir):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def export_tenders(fmt="csv", columns=None, search_text=None, chunk_size=EXPORT_CHUNK_SIZE,
+                   export_dir=EXPORT_DIR, db_path=tender_store.TENDERS_DB, **filters):
+    """
+    Write the tenders a query or search returns to a CSV or Parquet file,
+    streaming them from the store chunk by chunk so memory stays bounded by
+    chunk_size. Returns (path, rows written).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    prune_exports(export_dir)
+    os.makedirs(export_dir, exist_ok=True)
+    
+    columns = list(columns or tender_store.TENDER_COLUMNS)
+    # Search results carry their rank
+    file_columns = columns + ["search_rank"] if search_text else columns
+    
+    path = os.path.join(export_dir, f"tenders-{uuid.uuid4().hex}.{fmt}")
+    chunks = tender_store.iter_tenders(columns, search_text=search_text, chunk_size=chunk_size,
+                                       db_path=db_path, **filters)
+    try:
+        write = _write_parquet if fmt == "parquet" else _write_csv
+        rows = write(chunks, file_columns, path)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    
+    logger.info(f"Exported {rows} tenders to {path}")
+    return path, rows
@@ -0,0 +1,754 @@
+# storage/tender_store.py
+# SQLite tender store shared by the scrapers, the matcher and the dashboard
+
+import sqlite3
+import hashlib
+import re
+import pandas as pd
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from data_processing.normalizer import parse_deadlines, parse_emd_paise, apply_tender_dtypes
+
+logger = logging.getLogger(__name__)
+
+# Constants
+DATA_DIR = "data"
+TENDERS_DB = os.path.join(DATA_DIR, "tenders.db")
+ARCHIVE_DB_NAME = "tenders_archive.db"  # cold partition for closed tenders, next to the store
+SQLITE_TIMEOUT = 30  # seconds to wait for a writer holding the lock
+SCHEMA_VERSION = 3  # PRAGMA user_version of a current store; bump when the schema changes
+SQLITE_MAX_PARAMS = 500  # ids per IN (...) query
+SEARCH_LIMIT = 1000  # default number of ranked search results
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)  # bm25 weights for title, description, organization
+
+# Fields that make up a tender's content hash
+CONTENT_FIELDS = ["tender_id", "title", "organization", "deadline", "emd_amount", "description", "source", "url"]
+
+# Columns stored for every tender, in table order
+TENDER_COLUMNS = [
+    "tender_id", "title", "organization", "deadline", "deadline_date", "emd_amount", "emd_paise",
+    "description", "source", "url", "content_hash", "updated_at"
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenders (
+    tender_id TEXT PRIMARY KEY,
+    title TEXT,
+    organization TEXT,
+    deadline TEXT,
+    deadline_date TEXT,
+    emd_amount TEXT,
+    emd_paise INTEGER,
+    description TEXT,
+    source TEXT,
+    url TEXT,
+    content_hash TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tenders_source ON tenders(source);
+CREATE INDEX IF NOT EXISTS idx_tenders_organization ON tenders(organization);
+CREATE INDEX IF NOT EXISTS idx_tenders_deadline_date ON tenders(deadline_date);
+CREATE INDEX IF NOT EXISTS idx_tenders_updated_at ON tenders(updated_at);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('version', '0');
+
+-- Near-duplicate tenders (cross-portal listings, republished corrigenda) linked to their canonical record
+CREATE TABLE IF NOT EXISTS tender_aliases (
+    alias_id TEXT PRIMARY KEY,
+    canonical_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tender_aliases_canonical ON tender_aliases(canonical_id);
+
+-- MinHash signatures, recomputed only when a tender's content hash changes
+CREATE TABLE IF NOT EXISTS tender_signatures (
+    tender_id TEXT PRIMARY KEY,
+    content_hash TEXT,
+    signature BLOB
+);
+
+-- Full-text index over the searchable columns, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS tenders_fts USING fts5(
+    title, description, organization,
+    content='tenders', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tenders_fts_insert AFTER INSERT ON tenders BEGIN
+    INSERT INTO tenders_fts (rowid, title, description, organization)
+    VALUES (new.rowid, new.title, new.description, new.organization);
+END;
+CREATE TRIGGER IF NOT EXISTS tenders_fts_delete AFTER DELETE ON tenders BEGIN
+    INSERT INTO tenders_fts (tenders_fts, rowid, title, description, organization)
+    VALUES ('delete', old.rowid, old.title, old.description, old.organization);
+END;
+CREATE TRIGGER IF NOT EXISTS tenders_fts_update AFTER UPDATE OF title, description, organization ON tenders BEGIN
+    INSERT INTO tenders_fts (tenders_fts, rowid, title, description, organization)
+    VALUES ('delete', old.rowid, old.title, old.description, old.organization);
+    INSERT INTO tenders_fts (rowid, title, description, organization)
+    VALUES (new.rowid, new.title, new.description, new.organization);
+END;
+"""
+
+# EMD buckets for the dashboard rollups: (upper bound in rupees, exclusive, or None, label)
+EMD_BUCKETS = [
+    (100000, "Under ₹1 lakh"),
+    (500000, "₹1-5 lakh"),
+    (1000000, "₹5-10 lakh"),
+    (5000000, "₹10-50 lakh"),
+    (None, "₹50 lakh and above"),
+]
+
+def _emd_bucket_sql(row):
+    cases = " ".join(f"WHEN {row}.emd_paise < {bound * 100} THEN '{label}'" for bound, label in EMD_BUCKETS if bound)
+    return f"CASE WHEN {row}.emd_paise IS NULL THEN NULL {cases} ELSE '{EMD_BUCKETS[-1][1]}' END"
+
+# Dashboard rollups: dimension -> SQL expression giving a tender row's bucket (NULL to leave it out)
+ROLLUP_DIMENSIONS = {
+    "source": lambda row: f"{row}.source",
+    "organization": lambda row: f"{row}.organization",
+    "deadline_month": lambda row: f"substr({row}.deadline_date, 1, 7)",
+    "emd_bucket": _emd_bucket_sql,
+}
+
+def _canonical_sql(row):
+    return f"NOT EXISTS (SELECT 1 FROM tender_aliases WHERE alias_id = {row}.tender_id)"
+
+def _rollup_statements(row, delta, where, source=""):
+    """
+    Trigger statements adding delta (1 or -1) to the buckets of a tender row:
+    the trigger's new or old row, or the row aliased t selected by source
+    ("FROM tenders t"), in either case only when where holds
+    """
+    statements = []
+    for dimension, bucket in ROLLUP_DIMENSIONS.items():
+        if delta > 0:
+            statements.append(
+                f"INSERT INTO tender_rollups (dimension, bucket, count) "
+                f"SELECT '{dimension}', {bucket(row)}, 1 {source} WHERE {where} AND {bucket(row)} IS NOT NULL "
+                f"ON CONFLICT(dimension, bucket) DO UPDATE SET count = count + 1;"
+            )
+        else:
+            # Emptied buckets are dropped by a primary key seek, not a scan of the rollups
+            buckets = f"bucket IN (SELECT {bucket(row)} {source} WHERE {where})"
+            statements.append(
+                f"UPDATE tender_rollups SET count = count - 1 WHERE dimension = '{dimension}' AND {buckets};"
+            )
+            statements.append(
+                f"DELETE FROM tender_rollups WHERE dimension = '{dimension}' AND {buckets} AND count <= 0;"
+            )
+    return "\n    ".join(statements)
+
+# Counts of canonical tenders per bucket, kept current by triggers as tenders are
+# upserted or archived and as duplicates are linked or unlinked, so the dashboard
+# reads a few rows instead of scanning the tenders
+ROLLUP_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tender_rollups (
+    dimension TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (dimension, bucket)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS tenders_rollup_insert AFTER INSERT ON tenders BEGIN
+    {_rollup_statements("new", 1, _canonical_sql("new"))}
+END;
+CREATE TRIGGER IF NOT EXISTS tenders_rollup_delete AFTER DELETE ON tenders BEGIN
+    {_rollup_statements("old", -1, _canonical_sql("old"))}
+END;
+CREATE TRIGGER IF NOT EXISTS tenders_rollup_update AFTER UPDATE OF source, organization, deadline_date, emd_paise ON tenders BEGIN
+    {_rollup_statements("old", -1, _canonical_sql("old"))}
+    {_rollup_statements("new", 1, _canonical_sql("new"))}
+END;
+CREATE TRIGGER IF NOT EXISTS tender_aliases_rollup_insert AFTER INSERT ON tender_aliases BEGIN
+    {_rollup_statements("t", -1, "t.tender_id = new.alias_id", "FROM tenders t")}
+END;
+CREATE TRIGGER IF NOT EXISTS tender_aliases_rollup_delete AFTER DELETE ON tender_aliases BEGIN
+    {_rollup_statements("t", 1, "t.tender_id = old.alias_id", "FROM tenders t")}
+END;
+"""
+
+# Closed tenders keep every tender column plus the time they were archived
+ARCHIVE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS archive.tenders (
+    {', '.join(f"{column} {'INTEGER' if column == 'emd_paise' else 'TEXT'}" for column in TENDER_COLUMNS)},
+    archived_at TEXT,
+    PRIMARY KEY (tender_id)
+);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_deadline_date ON tenders(deadline_date);
+"""
+
+_initialized = set()  # store paths whose schema this process has checked
+_initialized_lock = threading.Lock()
+
+def _connect(db_path):
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=SQLITE_TIMEOUT)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _run_script(conn, script):
+    """Run a multi-statement script inside the caller's transaction (executescript would commit it)"""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+def init_store(db_path=TENDERS_DB):
+    """
+    Create or migrate the store schema. Checking an up-to-date store is a
+    single read of PRAGMA user_version; only an outdated one takes the write
+    lock, so readers never queue behind a scrape just to open a connection.
+    """
+    conn = _connect(db_path)
+    conn.isolation_level = None  # transactions are managed explicitly below
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        
+        # WAL lets the dashboard keep reading while a scrape is writing; it persists in the file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                _migrate(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Tender store {db_path} migrated to schema version {SCHEMA_VERSION}")
+    finally:
+        conn.close()
+
+def get_connection(db_path=TENDERS_DB):
+    """
+    Open a connection to the tender store. The schema is checked (and created
+    or migrated) the first time a process opens a store.
+    """
+    key = os.path.abspath(db_path)
+    if key not in _initialized:
+        with _initialized_lock:
+            if key not in _initialized:
+                init_store(db_path)
+                _initialized.add(key)
+    return _connect(db_path)
+
+def _migrate(conn):
+    """Bring the schema up to SCHEMA_VERSION inside the caller's write transaction"""
+    has_search_index = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'tenders_fts'").fetchone()
+    _run_script(conn, SCHEMA)
+    if not has_search_index:
+        # Index tenders stored before the full-text index existed
+        conn.execute("INSERT INTO tenders_fts (tenders_fts) VALUES ('rebuild')")
+    
+    # Columns introduced after a database was created are added and backfilled
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(tenders)")}
+    if "emd_paise" not in columns:
+        conn.execute("ALTER TABLE tenders ADD COLUMN emd_paise INTEGER")
+        rows = conn.execute("SELECT tender_id, emd_amount FROM tenders").fetchall()
+        if rows:
+            paise = parse_emd_paise([amount for _, amount in rows])
+            conn.executemany(
+                "UPDATE tenders SET emd_paise = ? WHERE tender_id = ?",
+                [(None if pd.isna(value) else int(value), tender_id) for (tender_id, _), value in zip(rows, paise)]
+            )
+    
+    # The rollup triggers are recreated from their current definitions and the
+    # counts recomputed to match (before version 2 they also counted duplicates;
+    # before version 3 every decrement scanned the rollups for empty buckets)
+    triggers = conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%rollup%'").fetchall()
+    for (trigger,) in triggers:
+        conn.execute(f"DROP TRIGGER {trigger}")
+    _run_script(conn, ROLLUP_SCHEMA)
+    _rebuild_rollups(conn)
+
+def _archive_path(db_path):
+    return os.path.join(os.path.dirname(db_path), ARCHIVE_DB_NAME)
+
+def _attach_archive(conn, db_path):
+    """Attach the archive database as "archive"; call outside a transaction"""
+    conn.execute("ATTACH DATABASE ? AS archive", (_archive_path(db_path),))
+    conn.executescript(ARCHIVE_SCHEMA)
+
+def _rebuild_rollups(conn):
+    """Recompute every rollup from the canonical tenders, inside the caller's transaction"""
+    conn.execute("DELETE FROM tender_rollups")
+    for dimension, bucket in ROLLUP_DIMENSIONS.items():
+        conn.execute(
+            f"INSERT INTO tender_rollups (dimension, bucket, count) "
+            f"SELECT ?, {bucket('t')} AS bucket, COUNT(*) FROM tenders t "
+            f"WHERE bucket IS NOT NULL AND {_canonical_sql('t')} GROUP BY bucket",
+            (dimension,)
+        )
+
+def tender_content_hash(record):
+    """Hash the content fields of a tender record to detect changes"""
+    content = "\x1f".join(str(record.get(field, "")) for field in CONTENT_FIELDS)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+def normalize_deadlines(deadlines):
+    """Normalize deadline strings to ISO dates (YYYY-MM-DD), None when unparseable"""
+    return [value.strftime("%Y-%m-%d") if not pd.isna(value) else None for value in parse_deadlines(deadlines)]
+
+def get_store_version(db_path=TENDERS_DB):
+    """Return the store version, bumped by every write that changes tenders"""
+    conn = get_connection(db_path)
+    try:
+        row = conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+        return int(row[0])
+    finally:
+        conn.close()
+
+def _bump_version(conn):
+    conn.execute("UPDATE store_meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+
+def _existing_hashes(conn, tender_ids, table="tenders"):
+    """Fetch the stored content hashes for a list of tender ids"""
+    hashes = {}
+    for start in range(0, len(tender_ids), SQLITE_MAX_PARAMS):
+        chunk = tender_ids[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT tender_id, content_hash FROM {table} WHERE tender_id IN ({placeholders})", chunk
+        )
+        hashes.update(rows)
+    return hashes
+
+def upsert_tenders(tenders_df, db_path=TENDERS_DB):
+    """
+    Insert or update tenders keyed by tender_id in a single transaction.
+    Rows whose content hash is unchanged are not rewritten, including
+    archived tenders that are still listed by a portal.
+    Returns counts of new, updated and unchanged tenders.
+    """
+    stats = {"new": 0, "updated": 0, "unchanged": 0}
+    if tenders_df.empty:
+        return stats
+    
+    tenders_df = tenders_df.drop_duplicates("tender_id", keep="last")
+    if "content_hash" not in tenders_df:
+        tenders_df = tenders_df.assign(
+            content_hash=[tender_content_hash(record) for record in tenders_df.to_dict("records")]
+        )
+    # Typed columns are always derived from the raw values
+    deadline_dates = normalize_deadlines(tenders_df["deadline"] if "deadline" in tenders_df else [None] * len(tenders_df))
+    emd_paise = parse_emd_paise(tenders_df["emd_amount"] if "emd_amount" in tenders_df else [None] * len(tenders_df))
+    updated_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    
+    conn = get_connection(db_path)
+    try:
+        has_archive = os.path.exists(_archive_path(db_path))
+        if has_archive:
+            _attach_archive(conn, db_path)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            previous = _existing_hashes(conn, tenders_df["tender_id"].tolist())
+            if has_archive:
+                unseen = [tender_id for tender_id in tenders_df["tender_id"] if tender_id not in previous]
+                archived = _existing_hashes(conn, unseen, table="archive.tenders")
+                previous.update(archived)
+            
+            rows = []
+            for record, deadline_date, paise in zip(tenders_df.to_dict("records"), deadline_dates, emd_paise):
+                old_hash = previous.get(record["tender_id"])
+                if old_hash is None:
+                    stats["new"] += 1
+                elif old_hash != record["content_hash"]:
+                    stats["updated"] += 1
+                else:
+                    stats["unchanged"] += 1
+                    continue
+                
+                record["deadline_date"] = deadline_date
+                record["emd_paise"] = None if pd.isna(paise) else int(paise)
+                record["updated_at"] = updated_at
+                rows.append(tuple(
+                    None if pd.isna(record.get(column)) else record.get(column) for column in TENDER_COLUMNS
+                ))
+            
+            if rows:
+                placeholders = ", ".join("?" * len(TENDER_COLUMNS))
+                assignments = ", ".join(f"{column} = excluded.{column}" for column in TENDER_COLUMNS[1:])
+                conn.executemany(
+                    f"INSERT INTO tenders ({', '.join(TENDER_COLUMNS)}) VALUES ({placeholders}) "
+                    f"ON CONFLICT(tender_id) DO UPDATE SET {assignments}",
+                    rows
+                )
+                if has_archive and archived:
+                    # Changed archived tenders (e.g. a corrigendum extending the deadline) come back to the store
+                    conn.executemany("DELETE FROM archive.tenders WHERE tender_id = ?",
+                                     [(row[0],) for row in rows if row[0] in archived])
+                _bump_version(conn)
+    finally:
+        conn.close()
+    
+    return stats
+
+def _build_filters(sources=None, organizations=None, deadline_from=None, deadline_to=None, tender_ids=None,
+                   canonical_only=False, updated_since=None, active_only=False, table="", clauses=None, params=None):
+    """Build a WHERE clause and its parameters from the supported predicates"""
+    prefix = f"{table}." if table else ""
+    clauses = list(clauses or [])
+    params = list(params or [])
+    for column, values in (("source", sources), ("organization", organizations), ("tender_id", tender_ids)):
+        if values is not None:
+            values = list(values)
+            if not values:
+                clauses.append("0")
+                continue
+            clauses.append(f"{prefix}{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if deadline_from is not None:
+        clauses.append(f"{prefix}deadline_date >= ?")
+        params.append(pd.Timestamp(deadline_from).strftime("%Y-%m-%d"))
+    if deadline_to is not None:
+        clauses.append(f"{prefix}deadline_date <= ?")
+        params.append(pd.Timestamp(deadline_to).strftime("%Y-%m-%d"))
+    if canonical_only:
+        clauses.append(f"{prefix}tender_id NOT IN (SELECT alias_id FROM tender_aliases)")
+    if updated_since is not None:
+        clauses.append(f"{prefix}updated_at >= ?")
+        params.append(updated_since)
+    if active_only:
+        # Seeks the deadline_date index; tenders without a known deadline stay active
+        clauses.append(f"({prefix}deadline_date >= ? OR {prefix}deadline_date IS NULL)")
+        params.append(pd.Timestamp.now().strftime("%Y-%m-%d"))
+    
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+def _check_columns(columns):
+    unknown = [column for column in columns if column not in TENDER_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown tender columns: {', '.join(unknown)}")
+
+def query_tenders(columns=None, sources=None, organizations=None, deadline_from=None, deadline_to=None,
+                  tender_ids=None, canonical_only=False, updated_since=None, active_only=False, order_by="tender_id",
+                  limit=None, offset=0, db_path=TENDERS_DB):
+    """
+    Read tenders from the store, pushing column selection, filters,
+    ordering and paging down to SQLite. Returns a dataframe with typed
+    columns (datetime64 deadline_date, Int64 emd_paise, categorical
+    source/organization) next to the raw ones. With canonical_only,
+    near-duplicate aliases are left out; updated_since (an ISO timestamp)
+    keeps tenders written at or after it; active_only leaves out tenders
+    whose deadline has passed.
+    """
+    columns = list(columns or TENDER_COLUMNS)
+    _check_columns(columns + [order_by])
+    where, params = _build_filters(sources, organizations, deadline_from, deadline_to, tender_ids, canonical_only,
+                                   updated_since, active_only)
+    
+    sql = f"SELECT {', '.join(columns)} FROM tenders{where} ORDER BY {order_by}"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([int(limit), int(offset)])
+    
+    conn = get_connection(db_path)
+    try:
+        return apply_tender_dtypes(pd.read_sql_query(sql, conn, params=params))
+    finally:
+        conn.close()
+
+def build_search_query(search_text):
+    """
+    Turn a search box string into an FTS5 query.
+    Quoted text becomes a phrase, every other word is prefix-matched,
+    and all terms must match. Returns None when there is nothing to search for.
+    """
+    terms = []
+    for phrase, words in re.findall(r'"([^"]*)"|([^"\s]+)', search_text or ""):
+        if phrase:
+            tokens = re.findall(r"\w+", phrase)
+            if tokens:
+                terms.append('"' + " ".join(tokens) + '"')
+        else:
+            terms.extend(f'"{token}"*' for token in re.findall(r"\w+", words))
+    return " ".join(terms) or None
+
+def _search_sql(match_query, columns, sources=None, organizations=None, deadline_from=None, deadline_to=None,
+                canonical_only=False, active_only=False):
+    """SQL and parameters of a ranked full-text search, best match first"""
+    where, params = _build_filters(
+        sources, organizations, deadline_from, deadline_to, canonical_only=canonical_only, active_only=active_only,
+        table="t",
+        clauses=["tenders_fts MATCH ?"], params=[match_query]
+    )
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    sql = (
+        f"SELECT {', '.join('t.' + column for column in columns)}, bm25(tenders_fts, {weights}) AS search_rank "
+        f"FROM tenders_fts JOIN tenders t ON t.rowid = tenders_fts.rowid{where} "
+        f"ORDER BY search_rank, t.rowid"
+    )
+    return sql, params
+
+def search_tenders(search_text, columns=None, sources=None, organizations=None, deadline_from=None,
+                   deadline_to=None, canonical_only=False, active_only=False, limit=SEARCH_LIMIT, offset=0,
+                   db_path=TENDERS_DB):
+    """
+    Full-text search over title, description and organization.
+    Returns matching tenders ranked by BM25 (best first) with a search_rank column.
+    """
+    columns = list(columns or TENDER_COLUMNS)
+    _check_columns(columns)
+    
+    match_query = build_search_query(search_text)
+    if match_query is None:
+        return pd.DataFrame(columns=columns + ["search_rank"])
+    
+    sql, params = _search_sql(match_query, columns, sources, organizations, deadline_from, deadline_to,
+                              canonical_only, active_only)
+    sql += " LIMIT ? OFFSET ?"
+    params.extend([int(limit), int(offset)])
+    
+    conn = get_connection(db_path)
+    try:
+        return apply_tender_dtypes(pd.read_sql_query(sql, conn, params=params))
+    finally:
+        conn.close()
+
+def count_tenders(sources=None, organizations=None, deadline_from=None, deadline_to=None, canonical_only=False,
+                  active_only=False, search_text=None, db_path=TENDERS_DB):
+    """Count the tenders matching the given predicates, and the full-text search when search_text is given"""
+    if search_text:
+        match_query = build_search_query(search_text)
+        if match_query is None:
+            return 0
+        where, params = _build_filters(
+            sources, organizations, deadline_from, deadline_to, canonical_only=canonical_only, active_only=active_only,
+            table="t", clauses=["tenders_fts MATCH ?"], params=[match_query]
+        )
+        sql = f"SELECT COUNT(*) FROM tenders_fts JOIN tenders t ON t.rowid = tenders_fts.rowid{where}"
+    else:
+        where, params = _build_filters(sources, organizations, deadline_from, deadline_to, canonical_only=canonical_only,
+                                       active_only=active_only)
+        sql = f"SELECT COUNT(*) FROM tenders{where}"
+    
+    conn = get_connection(db_path)
+    try:
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+def iter_tenders(columns=None, search_text=None, chunk_size=5000, db_path=TENDERS_DB, **filters):
+    """
+    Yield the tenders a query or search would return as dataframes of at most
+    chunk_size rows, so large result sets never have to be held in memory.
+    Plain queries page by tender_id (a primary key seek per chunk); searches
+    are ranked once and streamed from a single cursor.
+    """
+    columns = list(columns or TENDER_COLUMNS)
+    _check_columns(columns)
+    if search_text:
+        match_query = build_search_query(search_text)
+        if match_query is None:
+            return
+        sql, params = _search_sql(match_query, columns, **filters)
+        conn = get_connection(db_path)
+        try:
+            cursor = conn.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    return
+                yield apply_tender_dtypes(pd.DataFrame.from_records(rows, columns=names))
+        finally:
+            conn.close()
+    
+    key_columns = columns if "tender_id" in columns else ["tender_id"] + columns
+    where, params = _build_filters(**filters)
+    last_id = None
+    while True:
+        page_where = where
+        page_params = list(params)
+        if last_id is not None:
+            page_where += f"{' AND' if where else ' WHERE'} tender_id > ?"
+            page_params.append(last_id)
+        sql = f"SELECT {', '.join(key_columns)} FROM tenders{page_where} ORDER BY tender_id LIMIT ?"
+        page_params.append(int(chunk_size))
+        
+        conn = get_connection(db_path)
+        try:
+            chunk = apply_tender_dtypes(pd.read_sql_query(sql, conn, params=page_params))
+        finally:
+            conn.close()
+        if chunk.empty:
+            return
+        last_id = chunk["tender_id"].iloc[-1]
+        yield chunk[columns]
+
+def get_rollup(dimension, limit=None, db_path=TENDERS_DB):
+    """
+    Read a dashboard rollup (source, organization, deadline_month or emd_bucket).
+    Returns a series of counts indexed by bucket: deadline months in order, EMD
+    buckets from low to high, and otherwise largest groups first.
+    """
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Unknown rollup: {dimension}")
+    order = "bucket" if dimension == "deadline_month" else "count DESC, bucket"
+    sql = f"SELECT bucket, count FROM tender_rollups WHERE dimension = ? ORDER BY {order}"
+    params = [dimension]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    
+    conn = get_connection(db_path)
+    try:
+        counts = pd.read_sql_query(sql, conn, params=params).set_index("bucket")["count"]
+    finally:
+        conn.close()
+    
+    if dimension == "emd_bucket":
+        labels = [label for _, label in EMD_BUCKETS]
+        counts = counts.reindex([label for label in labels if label in counts.index])
+    counts.index.name = dimension
+    return counts
+
+def get_sources(db_path=TENDERS_DB):
+    """Return the distinct tender sources"""
+    conn = get_connection(db_path)
+    try:
+        return [row[0] for row in conn.execute("SELECT DISTINCT source FROM tenders WHERE source IS NOT NULL ORDER BY source")]
+    finally:
+        conn.close()
+
+def archive_expired(today=None, db_path=TENDERS_DB):
+    """
+    Move tenders whose deadline is before today (found by a range seek on the
+    deadline_date index) to the archive database, so matching and the dashboard
+    only work on open tenders. Their duplicate links and signatures are dropped.
+    Returns the number of tenders archived.
+    """
+    cutoff = pd.Timestamp(today or pd.Timestamp.now()).strftime("%Y-%m-%d")
+    archived_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    columns = ", ".join(TENDER_COLUMNS)
+    expired = "SELECT tender_id FROM main.tenders WHERE deadline_date < ?"
+    
+    conn = get_connection(db_path)
+    try:
+        _attach_archive(conn, db_path)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            count = conn.execute(f"SELECT COUNT(*) FROM ({expired})", (cutoff,)).fetchone()[0]
+            if count:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO archive.tenders ({columns}, archived_at) "
+                    f"SELECT {columns}, ? FROM main.tenders WHERE deadline_date < ?",
+                    (archived_at, cutoff)
+                )
+                conn.execute(f"DELETE FROM tender_aliases WHERE alias_id IN ({expired}) OR canonical_id IN ({expired})",
+                             (cutoff, cutoff))
+                conn.execute(f"DELETE FROM tender_signatures WHERE tender_id IN ({expired})", (cutoff,))
+                conn.execute("DELETE FROM main.tenders WHERE deadline_date < ?", (cutoff,))
+                _bump_version(conn)
+    finally:
+        conn.close()
+    
+    if count:
+        logger.info(f"Archived {count} tenders with deadlines before {cutoff}")
+    return count
+
+def query_archived_tenders(tender_ids=None, limit=None, db_path=TENDERS_DB):
+    """Read archived tenders, most recently closed first"""
+    if not os.path.exists(_archive_path(db_path)):
+        return apply_tender_dtypes(pd.DataFrame(columns=TENDER_COLUMNS + ["archived_at"]))
+    where, params = _build_filters(tender_ids=tender_ids)
+    sql = f"SELECT * FROM archive.tenders{where} ORDER BY deadline_date DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    
+    conn = get_connection(db_path)
+    try:
+        _attach_archive(conn, db_path)
+        return apply_tender_dtypes(pd.read_sql_query(sql, conn, params=params))
+    finally:
+        conn.close()
+
+def get_signatures(db_path=TENDERS_DB):
+    """
+    Return the stored MinHash signatures that are still current,
+    as a dict of tender_id -> signature bytes
+    """
+    conn = get_connection(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT s.tender_id, s.signature FROM tender_signatures s "
+            "JOIN tenders t ON t.tender_id = s.tender_id AND t.content_hash = s.content_hash"
+        )
+        return dict(rows)
+    finally:
+        conn.close()
+
+def save_signatures(rows, db_path=TENDERS_DB):
+    """Store MinHash signatures given as (tender_id, content_hash, signature bytes) tuples"""
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO tender_signatures (tender_id, content_hash, signature) VALUES (?, ?, ?)",
+                rows
+            )
+    finally:
+        conn.close()
+
+def replace_aliases(aliases, db_path=TENDERS_DB):
+    """
+    Replace the duplicate links with a dict of alias_id -> canonical_id.
+    The store version is bumped only when the links change.
+    Returns True when they changed.
+    """
+    conn = get_connection(db_path)
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            current = dict(conn.execute("SELECT alias_id, canonical_id FROM tender_aliases"))
+            if current == aliases:
+                return False
+            # Only changed links are rewritten, as each one updates the rollups
+            conn.executemany(
+                "DELETE FROM tender_aliases WHERE alias_id = ?",
+                [(alias_id,) for alias_id, canonical_id in current.items() if aliases.get(alias_id) != canonical_id]
+            )
+            conn.executemany(
+                "INSERT INTO tender_aliases (alias_id, canonical_id) VALUES (?, ?)",
+                [(alias_id, canonical_id) for alias_id, canonical_id in aliases.items() if current.get(alias_id) != canonical_id]
+            )
+            _bump_version(conn)
+            return True
+    finally:
+        conn.close()
+
+def get_aliases(canonical_ids=None, db_path=TENDERS_DB):
+    """Return the duplicate links (alias_id, canonical_id), optionally for some canonical tenders"""
+    sql = "SELECT alias_id, canonical_id FROM tender_aliases"
+    params = []
+    if canonical_ids is not None:
+        canonical_ids = list(canonical_ids)
+        if not canonical_ids:
+            return pd.DataFrame(columns=["alias_id", "canonical_id"])
+        sql += f" WHERE canonical_id IN ({', '.join('?' * len(canonical_ids))})"
+        params = canonical_ids
+    
+    conn = get_connection(db_path)
+    try:
+        return pd.read_sql_query(sql + " ORDER BY canonical_id, alias_id", conn, params=params)
+    finally:
+        conn.close()
+
+def import_pickle(pickle_path, db_path=TENDERS_DB):
+    """Import tenders from a legacy pandas pickle into the store"""
+    tenders_df = pd.read_pickle(pickle_path)
+    stats = upsert_tenders(tenders_df, db_path)
+    logger.info(f"Imported {stats['new']} tenders from {pickle_path}")
+    return stats
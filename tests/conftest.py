@@ -0,0 +1,8 @@
+# tests/conftest.py
+# Shared pytest setup
+
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
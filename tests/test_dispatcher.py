@@ -0,0 +1,176 @@
+# tests/test_dispatcher.py
+# Pooled digest delivery, retries and rate limiting against a stub SMTP server
+
+import socketserver
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from notification.dispatcher import NotificationDispatcher, get_deliveries
+
+class StubSMTPServer:
+    """
+    Minimal SMTP server on a local port. The next len(mail_replies) MAIL
+    commands get those replies instead of 250 (e.g. "451 try later"), and a
+    connection is dropped after drop_after messages when that is set.
+    """
+    
+    def __init__(self, mail_replies=(), drop_after=None):
+        self.mail_replies = list(mail_replies)
+        self.drop_after = drop_after
+        self.connections = 0
+        self.messages = []  # (time received, message text)
+        self.lock = threading.Lock()
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    @property
+    def port(self):
+        return self.server.server_address[1]
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f"{line}\r\n".encode("utf-8"))
+            
+            def handle(self):
+                with stub.lock:
+                    stub.connections += 1
+                sent = 0
+                self.reply("220 stub ESMTP")
+                for raw in self.rfile:
+                    command = raw.decode("utf-8").strip().split(" ")[0].upper()
+                    if command in ("EHLO", "HELO"):
+                        self.reply("250 stub")
+                    elif command == "MAIL":
+                        with stub.lock:
+                            reply = stub.mail_replies.pop(0) if stub.mail_replies else "250 ok"
+                        self.reply(reply)
+                    elif command in ("RCPT", "RSET", "NOOP"):
+                        self.reply("250 ok")
+                    elif command == "DATA":
+                        self.reply("354 end with <CRLF>.<CRLF>")
+                        lines = []
+                        for line in self.rfile:
+                            if line.rstrip(b"\r\n") == b".":
+                                break
+                            lines.append(line.decode("utf-8"))
+                        with stub.lock:
+                            stub.messages.append((time.monotonic(), "".join(lines)))
+                        self.reply("250 queued")
+                        sent += 1
+                        if stub.drop_after is not None and sent >= stub.drop_after:
+                            return
+                    elif command == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("502 not implemented")
+        
+        return Handler
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def tenders(*tender_ids):
+    return pd.DataFrame([{
+        "tender_id": tender_id,
+        "title": f"Tender {tender_id}",
+        "organization": "Ministry of Testing",
+        "deadline": "2030-01-01",
+        "emd_amount": "₹1,000",
+        "match_score": 0.5,
+        "url": f"https://example.gov.in/{tender_id}"
+    } for tender_id in tender_ids])
+
+@pytest.fixture
+def dispatch(tmp_path):
+    """Make dispatchers sending to a stub server, recording deliveries in a scratch store"""
+    dispatchers = []
+    
+    def make(stub, **kwargs):
+        kwargs.setdefault("max_per_minute", 0)
+        kwargs.setdefault("retry_backoff", 0.01)
+        dispatcher = NotificationDispatcher("127.0.0.1", stub.port, sender_email="alerts@example.gov.in",
+                                            password=None, use_tls=False, db_path=str(tmp_path / "tenders.db"),
+                                            **kwargs)
+        dispatchers.append(dispatcher)
+        return dispatcher
+    
+    yield make
+    for dispatcher in dispatchers:
+        dispatcher.close(wait=False)
+
+def deliveries(tmp_path):
+    return get_deliveries(db_path=str(tmp_path / "tenders.db")).set_index("delivery_id")
+
+def test_digests_share_one_pooled_connection(dispatch, tmp_path):
+    sent = []
+    with StubSMTPServer() as stub:
+        dispatcher = dispatch(stub)
+        ids = [dispatcher.submit_digest(f"user{i}@example.com", tenders(f"T-{i}", f"T-{i}b"),
+                                        on_sent=lambda i=i: sent.append(i)) for i in range(5)]
+        dispatcher.join()
+    
+    assert stub.connections == 1
+    assert len(stub.messages) == 5
+    assert "2 New Tender Matches" in stub.messages[0][1]
+    assert sorted(sent) == list(range(5))
+    assert (deliveries(tmp_path).loc[ids, "status"] == "sent").all()
+
+def test_dropped_connections_are_reopened(dispatch):
+    with StubSMTPServer(drop_after=1) as stub:
+        dispatcher = dispatch(stub)
+        for i in range(3):
+            dispatcher.submit_digest(f"user{i}@example.com", tenders(f"T-{i}"))
+        dispatcher.join()
+    
+    assert len(stub.messages) == 3
+
+def test_transient_failures_are_retried(dispatch, tmp_path):
+    sent = []
+    with StubSMTPServer(mail_replies=["451 try again later", "421 too busy"]) as stub:
+        dispatcher = dispatch(stub)
+        delivery_id = dispatcher.submit_digest("user@example.com", tenders("T-1"), on_sent=lambda: sent.append(1))
+        dispatcher.join()
+    
+    delivery = deliveries(tmp_path).loc[delivery_id]
+    assert (delivery["status"], delivery["attempts"]) == ("sent", 3)
+    assert len(stub.messages) == 1
+    assert sent == [1]
+
+def test_permanent_failures_are_not_retried(dispatch, tmp_path):
+    sent = []
+    with StubSMTPServer(mail_replies=["550 mailbox unavailable"]) as stub:
+        dispatcher = dispatch(stub)
+        delivery_id = dispatcher.submit_digest("user@example.com", tenders("T-1"), on_sent=lambda: sent.append(1))
+        dispatcher.join()
+    
+    delivery = deliveries(tmp_path).loc[delivery_id]
+    assert (delivery["status"], delivery["attempts"]) == ("failed", 1)
+    assert "550" in delivery["error"]
+    assert stub.messages == []
+    assert sent == []
+
+def test_sends_are_rate_limited_across_workers(dispatch):
+    # 600 a minute spaces sends 0.1s apart, however many sender threads there are
+    with StubSMTPServer() as stub:
+        dispatcher = dispatch(stub, workers=2, max_per_minute=600)
+        for i in range(5):
+            dispatcher.submit_digest(f"user{i}@example.com", tenders(f"T-{i}"))
+        dispatcher.join()
+    
+    times = sorted(received for received, _ in stub.messages)
+    assert len(times) == 5
+    assert times[-1] - times[0] >= 4 * 0.1 - 0.05
+    assert stub.connections == 2
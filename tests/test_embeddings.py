@@ -0,0 +1,102 @@
+# tests/test_embeddings.py
+# Semantic index builds over the open canonical tenders and approximate top-k search
+
+from datetime import date, timedelta
+import os
+
+import pandas as pd
+import pytest
+
+from recommendation.embeddings import (
+    HashingEmbeddingModel, build_embedding_index, load_embedding_index, refresh_embedding_index,
+    semantic_top_k_matches
+)
+from storage import tender_store
+
+TOPICS = {
+    "T-ROAD": "Construction of rural road with bitumen surfacing and drainage",
+    "T-SOLAR": "Supply and installation of rooftop solar photovoltaic power plants",
+    "T-IT": "Annual maintenance of computer hardware, servers and network equipment",
+    "T-MED": "Procurement of medical equipment and hospital consumables",
+}
+
+def tender(tender_id, description, days=30):
+    return {
+        "tender_id": tender_id,
+        "title": description.split(" with ")[0],
+        "organization": "Ministry of Testing",
+        "deadline": (date.today() + timedelta(days=days)).isoformat(),
+        "emd_amount": "₹1,000",
+        "description": description,
+        "source": "CPPP",
+        "url": f"https://example.gov.in/{tender_id}"
+    }
+
+@pytest.fixture
+def model():
+    return HashingEmbeddingModel(dim=64, n_features=2 ** 12)
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return str(tmp_path / "embeddings")
+
+@pytest.fixture
+def tenders_df():
+    records = [tender(tender_id, description) for tender_id, description in TOPICS.items()]
+    records += [tender(f"T-FILLER-{i}", f"Upkeep of road drainage and hospital equipment, lot {i}") for i in range(20)]
+    return pd.DataFrame(records)
+
+def test_index_covers_open_canonical_tenders_only(tmp_path, model, index_dir):
+    db_path = str(tmp_path / "tenders.db")
+    tender_store.upsert_tenders(pd.DataFrame([
+        tender("T-1", TOPICS["T-ROAD"]),
+        tender("T-2", TOPICS["T-ROAD"]),
+        tender("T-3", TOPICS["T-SOLAR"], days=-1),
+        tender("T-4", TOPICS["T-IT"]),
+    ]), db_path)
+    tender_store.replace_aliases({"T-2": "T-1"}, db_path)
+    tender_store.archive_expired(db_path=db_path)
+    store_version = tender_store.get_store_version(db_path)
+    
+    index = refresh_embedding_index(store_version, model, index_dir, db_path=db_path)
+    
+    assert sorted(index.tender_ids) == ["T-1", "T-4"]
+    assert index.meta["store_version"] == store_version
+    # A current index is loaded, not rebuilt
+    assert refresh_embedding_index(store_version, model, index_dir, db_path=db_path).meta == index.meta
+
+def test_builds_stage_in_their_own_directory(model, index_dir, tenders_df, tmp_path):
+    build_embedding_index(tenders_df, model, store_version=1, index_dir=index_dir)
+    build_embedding_index(tenders_df.iloc[:5], model, store_version=2, index_dir=index_dir)
+    
+    assert os.listdir(tmp_path) == ["embeddings"]
+    assert load_embedding_index(model, 1, index_dir) is None
+    assert len(load_embedding_index(model, 2, index_dir).tender_ids) == 5
+
+def test_best_match_ranks_first(model, index_dir, tenders_df):
+    index = build_embedding_index(tenders_df, model, store_version=1, index_dir=index_dir)
+    
+    matches = semantic_top_k_matches("We install solar photovoltaic power plants on rooftops",
+                                     tenders_df, index, model, k=3)
+    
+    assert len(matches) == 3
+    assert matches["tender_id"].iloc[0] == "T-SOLAR"
+    assert matches["match_score"].is_monotonic_decreasing
+
+def test_k_results_when_tenders_df_is_a_subset(model, index_dir, tenders_df):
+    index = build_embedding_index(tenders_df, model, store_version=1, index_dir=index_dir)
+    # Only the filler tenders, which rank below the topical ones for this profile
+    subset = tenders_df[tenders_df["tender_id"].str.startswith("T-FILLER")].reset_index(drop=True)
+    
+    matches = semantic_top_k_matches(TOPICS["T-ROAD"] + " " + TOPICS["T-MED"], subset, index, model, k=18)
+    
+    assert len(matches) == 18
+    assert matches["tender_id"].isin(subset["tender_id"]).all()
+
+def test_empty_store_gives_no_matches(model, index_dir, tenders_df):
+    index = build_embedding_index(tenders_df.iloc[:0], model, store_version=1, index_dir=index_dir)
+    
+    matches = semantic_top_k_matches("Road construction", tenders_df.iloc[:0], index, model)
+    
+    assert matches.empty
+    assert "match_score" in matches.columns
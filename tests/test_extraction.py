@@ -0,0 +1,13 @@
+# tests/test_extraction.py
+# The key-details extraction engine against the original regex implementation
+
+import pytest
+
+from data_processing.extraction_regression import EDGE_CASES, build_regression_corpus, find_mismatches
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_edge_cases_match_the_original(text):
+    assert find_mismatches([text]) == []
+
+def test_corpus_matches_the_original():
+    assert find_mismatches(build_regression_corpus()) == []
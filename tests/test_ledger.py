@@ -0,0 +1,93 @@
+# tests/test_ledger.py
+# Nightly alert runs that only send matches not yet notified
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from notification import ledger
+from storage import tender_store
+
+PROFILE = "We install rooftop solar power plants and solar water pumps"
+
+TENDERS = {
+    "T-1": "Installation of rooftop solar power plants on school buildings",
+    "T-2": "Supply of solar water pumps for irrigation",
+    "T-3": "Resurfacing of the national highway with bitumen",
+}
+
+class FakeDispatcher:
+    """Records digests instead of emailing them; a failing one never reports them sent"""
+    
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.digests = []  # (recipient, sorted tender ids)
+    
+    def submit_digest(self, recipient, tenders_df, on_sent=None):
+        self.digests.append((recipient, sorted(tenders_df["tender_id"])))
+        if not self.fail and on_sent is not None:
+            on_sent()
+
+def tender(tender_id, description):
+    return {
+        "tender_id": tender_id,
+        "title": description,
+        "organization": "Ministry of Testing",
+        "deadline": (date.today() + timedelta(days=30)).isoformat(),
+        "emd_amount": "₹1,000",
+        "description": description,
+        "source": "CPPP",
+        "url": f"https://example.gov.in/{tender_id}"
+    }
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    # Persisted matching artifacts live under data/, so keep them in the scratch directory too
+    monkeypatch.chdir(tmp_path)
+    db_path = str(tmp_path / "tenders.db")
+    tender_store.upsert_tenders(pd.DataFrame([tender(tender_id, text) for tender_id, text in TENDERS.items()]), db_path)
+    ledger.subscribe("buyer@example.com", PROFILE, threshold=0.1, db_path=db_path)
+    return db_path
+
+@pytest.fixture
+def vectorizer():
+    return TfidfVectorizer().fit(list(TENDERS.values()) + [PROFILE])
+
+def watermark(db_path):
+    return ledger.get_subscriptions(db_path)["last_seen"].iloc[0]
+
+def test_matches_are_not_resent(db_path, vectorizer):
+    dispatcher = FakeDispatcher()
+    
+    assert ledger.run_alerts(dispatcher, vectorizer, db_path=db_path) == 2
+    assert ledger.run_alerts(dispatcher, vectorizer, db_path=db_path) == 0
+    
+    assert dispatcher.digests == [("buyer@example.com", ["T-1", "T-2"])]
+
+def test_failed_delivery_is_retried(db_path, vectorizer):
+    failing = FakeDispatcher(fail=True)
+    ledger.run_alerts(failing, vectorizer, db_path=db_path)
+    
+    # Neither the ledger nor the watermark moved
+    assert pd.isna(watermark(db_path))
+    assert len(failing.digests) == 1
+    
+    dispatcher = FakeDispatcher()
+    assert ledger.run_alerts(dispatcher, vectorizer, db_path=db_path) == 2
+    assert dispatcher.digests == [("buyer@example.com", ["T-1", "T-2"])]
+    assert not pd.isna(watermark(db_path))
+
+def test_updated_tender_is_renotified_once(db_path, vectorizer):
+    dispatcher = FakeDispatcher()
+    ledger.run_alerts(dispatcher, vectorizer, db_path=db_path)
+    
+    # A corrigendum changes the tender's content, in the same second as the last run or later
+    tender_store.upsert_tenders(pd.DataFrame([
+        tender("T-2", TENDERS["T-2"] + " (corrigendum: solar pumps of 5 HP)")
+    ]), db_path)
+    ledger.run_alerts(dispatcher, vectorizer, db_path=db_path)
+    ledger.run_alerts(dispatcher, vectorizer, db_path=db_path)
+    
+    assert dispatcher.digests == [("buyer@example.com", ["T-1", "T-2"]), ("buyer@example.com", ["T-2"])]
@@ -0,0 +1,149 @@
+# tests/test_scraper.py
+# Concurrent fetching, retries and conditional requests against a stub HTTP server
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+
+import pytest
+import requests
+
+from data_collection import scraper
+
+class StubPortal:
+    """
+    Listing pages served by a local HTTP server. pages maps a path to its HTML;
+    failures maps a path to how many 503s it returns before succeeding.
+    """
+    
+    def __init__(self, pages, failures=None, delay=0.0):
+        self.pages = pages
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.requests = []  # (path, request headers)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+    
+    def requested(self, path):
+        return [headers for requested_path, headers in self.requests if requested_path == path]
+    
+    def _handler(self):
+        portal = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with portal.lock:
+                    portal.requests.append((self.path, dict(self.headers)))
+                    portal.in_flight += 1
+                    portal.max_in_flight = max(portal.max_in_flight, portal.in_flight)
+                    failing = portal.failures.get(self.path, 0) > 0
+                    if failing:
+                        portal.failures[self.path] -= 1
+                try:
+                    time.sleep(portal.delay)
+                    if failing:
+                        self._respond(503, b"busy")
+                    elif self.path not in portal.pages:
+                        self._respond(404, b"not found")
+                    else:
+                        etag = f'"{self.path}-v1"'
+                        if self.headers.get("If-None-Match") == etag:
+                            self._respond(304, b"", {"ETag": etag})
+                        else:
+                            self._respond(200, portal.pages[self.path].encode("utf-8"), {"ETag": etag})
+                finally:
+                    with portal.lock:
+                        portal.in_flight -= 1
+            
+            def _respond(self, status, body, headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def __enter__(self):
+        self.thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def listing(next_path=None):
+    link = f'<a rel="next" href="{next_path}">Next</a>' if next_path else ""
+    return f"<html><body><table></table>{link}</body></html>"
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(scraper, "BACKOFF_FACTOR", 0)
+
+@pytest.fixture
+def registered(monkeypatch):
+    """Register scrapers for a test only"""
+    monkeypatch.setattr(scraper, "SCRAPERS", {})
+    
+    def register(name, url):
+        @scraper.register_scraper(name, url)
+        def iter_stub_tenders(session=None, url=None, http_cache=None):
+            for page_number, soup in scraper.iter_listing_pages(url, session, http_cache=http_cache):
+                yield [{"tender_id": f"{name}-{page_number}", "source": name}] if soup is not None else []
+    
+    return register
+
+def test_portals_are_fetched_concurrently_within_the_host_limit(registered):
+    pages = {f"/portal{i}": listing() for i in range(4)}
+    with StubPortal(pages, delay=0.3) as portal:
+        for i in range(4):
+            registered(f"P{i}", portal.url(f"/portal{i}"))
+        
+        start = time.perf_counter()
+        records = [record for _, page in scraper.iter_tender_pages() for record in page]
+        elapsed = time.perf_counter() - start
+    
+    assert sorted(record["tender_id"] for record in records) == ["P0-1", "P1-1", "P2-1", "P3-1"]
+    # All portals share one host, so at most PER_HOST_LIMIT requests overlap
+    assert portal.max_in_flight == scraper.PER_HOST_LIMIT
+    assert elapsed < 4 * 0.3
+
+def test_transient_errors_are_retried():
+    with StubPortal({"/listing": listing()}, failures={"/listing": 2}) as portal:
+        response = scraper.fetch_page(portal.url("/listing"), scraper.create_session())
+    
+    assert response.status_code == 200
+    assert len(portal.requested("/listing")) == 3
+
+def test_persistent_errors_raise_after_the_retries():
+    with StubPortal({"/listing": listing()}, failures={"/listing": 100}) as portal:
+        with pytest.raises(requests.HTTPError):
+            scraper.fetch_page(portal.url("/listing"), scraper.create_session())
+    
+    assert len(portal.requested("/listing")) == scraper.MAX_RETRIES + 1
+
+def test_unchanged_pages_are_skipped_with_conditional_requests():
+    pages = {"/page1": listing("/page2"), "/page2": listing()}
+    http_cache = {}
+    with StubPortal(pages) as portal:
+        first = list(scraper.iter_listing_pages(portal.url("/page1"), http_cache=http_cache))
+        second = list(scraper.iter_listing_pages(portal.url("/page1"), http_cache=http_cache))
+    
+    assert [soup is not None for _, soup in first] == [True, True]
+    assert http_cache[portal.url("/page1")]["next_url"] == portal.url("/page2")
+    
+    # Both pages answer 304, and pagination follows the remembered next link
+    assert [(page_number, soup) for page_number, soup in second] == [(1, None), (2, None)]
+    assert portal.requested("/page1")[1]["If-None-Match"] == '"/page1-v1"'
+    assert portal.requested("/page2")[1]["If-None-Match"] == '"/page2-v1"'
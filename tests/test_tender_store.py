@@ -0,0 +1,117 @@
+# tests/test_tender_store.py
+# Dashboard rollups kept current by triggers as tenders and duplicate links change
+
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from storage import tender_store
+
+TODAY = date.today()
+
+def tender(tender_id, organization="Ministry of Testing", source="CPPP", days=30, emd="₹150,000"):
+    return {
+        "tender_id": tender_id,
+        "title": f"Tender {tender_id}",
+        "organization": organization,
+        "deadline": (TODAY + timedelta(days=days)).isoformat(),
+        "emd_amount": emd,
+        "description": f"Description of {tender_id}",
+        "source": source,
+        "url": f"https://example.gov.in/{tender_id}"
+    }
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tenders.db")
+
+def expected_rollups(db_path):
+    """Every rollup recomputed from the canonical tenders"""
+    tenders = tender_store.query_tenders(canonical_only=True, db_path=db_path)
+    emd_labels = pd.Series(
+        [None if pd.isna(paise) else next(label for bound, label in tender_store.EMD_BUCKETS
+                                          if bound is None or paise < bound * 100)
+         for paise in tenders["emd_paise"]],
+        dtype=object
+    )
+    buckets = {
+        "source": tenders["source"].astype(object),
+        "organization": tenders["organization"].astype(object),
+        "deadline_month": tenders["deadline_date"].dt.strftime("%Y-%m"),
+        "emd_bucket": emd_labels,
+    }
+    return {dimension: values.dropna().value_counts().to_dict() for dimension, values in buckets.items()}
+
+def stored_rollups(db_path):
+    return {
+        dimension: tender_store.get_rollup(dimension, db_path=db_path).to_dict()
+        for dimension in tender_store.ROLLUP_DIMENSIONS
+    }
+
+def assert_rollups_current(db_path):
+    assert stored_rollups(db_path) == expected_rollups(db_path)
+    # Emptied buckets are dropped rather than kept at zero
+    conn = tender_store.get_connection(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM tender_rollups WHERE count <= 0").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+def test_inserts_are_counted(db_path):
+    tender_store.upsert_tenders(pd.DataFrame([
+        tender("T-1"), tender("T-2", "Indian Railways", "GeM", emd="₹9,00,000"), tender("T-3", emd=None)
+    ]), db_path)
+    
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["source"] == {"CPPP": 2, "GeM": 1}
+
+def test_updates_move_tenders_between_buckets(db_path):
+    tender_store.upsert_tenders(pd.DataFrame([tender("T-1"), tender("T-2", "Indian Railways")]), db_path)
+    tender_store.upsert_tenders(pd.DataFrame([
+        tender("T-2", "Ministry of Testing", days=90, emd="₹60,00,000")
+    ]), db_path)
+    
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["organization"] == {"Ministry of Testing": 2}
+
+def test_archived_tenders_leave_the_rollups(db_path):
+    tender_store.upsert_tenders(pd.DataFrame([
+        tender("T-1"), tender("T-2", "Indian Railways", days=-3), tender("T-3", days=-1)
+    ]), db_path)
+    assert tender_store.archive_expired(db_path=db_path) == 2
+    
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["organization"] == {"Ministry of Testing": 1}
+
+def test_aliased_tenders_are_not_counted(db_path):
+    tender_store.upsert_tenders(pd.DataFrame([
+        tender("T-1"), tender("T-2", source="GeM"), tender("T-3", "Indian Railways", source="GeM")
+    ]), db_path)
+    
+    # Linking a duplicate takes it out of the counts
+    tender_store.replace_aliases({"T-2": "T-1"}, db_path)
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["source"] == {"CPPP": 1, "GeM": 1}
+    
+    # Re-linking swaps which tender is counted
+    tender_store.replace_aliases({"T-1": "T-2"}, db_path)
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["source"] == {"GeM": 2}
+    
+    # Updating an alias leaves the counts alone
+    tender_store.upsert_tenders(pd.DataFrame([tender("T-1", "Indian Railways")]), db_path)
+    assert_rollups_current(db_path)
+    
+    # Unlinking counts it again
+    tender_store.replace_aliases({}, db_path)
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["source"] == {"CPPP": 1, "GeM": 2}
+
+def test_archiving_a_canonical_tender_counts_its_alias(db_path):
+    tender_store.upsert_tenders(pd.DataFrame([tender("T-1", days=-1), tender("T-2", source="GeM")]), db_path)
+    tender_store.replace_aliases({"T-2": "T-1"}, db_path)
+    tender_store.archive_expired(db_path=db_path)
+    
+    assert_rollups_current(db_path)
+    assert stored_rollups(db_path)["source"] == {"GeM": 1}